@@ -0,0 +1,253 @@
+# This program benchmarks the hot paths of LoanSchedule.py and CPI.py
+# Outputs:
+#   Printed table of results (throughput, latency percentiles, peak memory)
+#   JSON file with the same results (default: bench_results.json)
+#
+# Benchmarks (each run at several sizes on synthetic, seeded data):
+#   payments:          MortgagePayment(...).payments(principal) for every loan in a portfolio
+#                      (warm: rate factors come from the rate_factors cache)
+#   payments_cold:     the same with the rate_factors cache cleared first (uncached path)
+#   batch_payments:    batch_payments(...) over the same portfolio in one call
+#   schedule:          build_payment_schedule(principal, name) for every loan and frequency
+#   load_cpi:          load_cpi(files) over synthetic multi-year, multi-province CPI CSV files
+#   month_change:      month_change(...) over the loaded synthetic CPI table
+#   import_to_first_payment: fresh interpreter, time from `import LoanSchedule` to the first
+#                      payments() result (startup latency for library users)
+#
+# Latency percentiles (p50/p95/p99) are per operation: single payments, schedules and CPI files are
+# timed one by one (up to LATENCY_SAMPLES each). For batch_payments, month_change and
+# import_to_first_payment one call is one operation. A percentile is reported as "-" when there
+# are too few samples for it (MIN_SAMPLES).
+#
+# Regression tracking:
+#   --save-baseline FILE   store the results as the new baseline
+#   --baseline FILE        compare against a stored baseline; any benchmark whose median time is more
+#                          than --tolerance (default 25%) slower, or whose peak memory grew by more
+#                          than --tolerance (and MEMORY_SLACK_MB), fails the run (exit code 1)
+#
+# Usage: python Benchmarks.py [--sizes small medium large] [--repeat 5] [--output FILE]
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from LoanSchedule import FREQUENCIES, MortgagePayment, batch_payments, rate_factors
+from CPI import load_cpi, month_change, read_cpi_file
+
+# Number of loans and CPI (provinces, years, items) for each size
+SIZES = {
+    "small": {"loans": 1000, "schedule_loans": 20, "provinces": 11, "years": 1, "items": 15},
+    "medium": {"loans": 20000, "schedule_loans": 100, "provinces": 20, "years": 10, "items": 50},
+    "large": {"loans": 200000, "schedule_loans": 400, "provinces": 40, "years": 30, "items": 300}
+}
+
+# Function to build a synthetic portfolio of loans (same seed -> same portfolio)
+def synthetic_portfolio(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "principal": rng.uniform(50000, 2000000, n).round(2),
+        "quoted_rate": rng.choice(np.arange(2.0, 9.0, 0.05).round(2), n),
+        "amortization_years": rng.choice([15, 20, 25, 30], n)
+    })
+
+# Function to write synthetic CPI CSV files in the StatCan wide layout (Item, 24-Jan, 24-Feb, ...)
+# Returns the files dict expected by load_cpi
+def synthetic_cpi_files(folder, provinces, years, items, seed=0):
+    rng = np.random.default_rng(seed)
+    months = pd.period_range("2024-01", periods=12 * years, freq="M")
+    labels = [m.strftime("%y-%b") for m in months]
+    item_names = (["All-items", "Food", "Shelter", "Services"] + ["Item {}".format(k) for k in range(items)])[:items]
+    files = {}
+    for p in range(provinces):
+        growth = 1 + rng.normal(0.002, 0.004, size=(len(item_names), len(months)))
+        cpi = (rng.uniform(90, 200, size=(len(item_names), 1)) * np.cumprod(growth, axis=1)).round(1)
+        df = pd.DataFrame(cpi, columns=labels)
+        df.insert(0, "Item", item_names)
+        path = os.path.join(folder, "P{:02d}.CPI.csv".format(p))
+        df.to_csv(path, index=False)
+        files["Province {}".format(p)] = path
+    return files
+
+# Per-operation latency samples taken per benchmark (spread evenly over its operations)
+LATENCY_SAMPLES = 2000
+
+# Fewest latency samples needed to report each percentile (reported as None below that)
+MIN_SAMPLES = {"p50_ms": 1, "p95_ms": 20, "p99_ms": 100}
+
+# Function to turn timings into the result dict shared by every benchmark
+# times: seconds per full run (throughput); latencies: seconds per single operation
+# (defaults to the run times when a run is one operation); peak_mb is None when memory was not measured
+def summarize(times, ops, peak_mb, latencies=None):
+    times = np.array(times)
+    latencies = times if latencies is None else np.array(latencies)
+    result = {
+        "ops": ops,
+        "median_s": float(np.median(times)),
+        "ops_per_s": float(ops / np.median(times)),
+        "latency_samples": len(latencies)
+    }
+    for key, q in (("p50_ms", 50), ("p95_ms", 95), ("p99_ms", 99)):
+        enough = len(latencies) >= MIN_SAMPLES[key]
+        result[key] = float(np.percentile(latencies, q) * 1000) if enough else None
+    result["peak_mb"] = peak_mb
+    return result
+
+# Function to time fn() `repeat` times; returns latency percentiles, throughput and peak memory
+# `ops` is how many operations one call of fn() performs (for throughput)
+# `op(i)` runs operation i on its own; when given, latency percentiles come from timing single
+# operations, otherwise one call of fn() is one operation
+def measure(fn, ops, repeat, op=None):
+    fn()  # Warm-up run (imports, caches)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    latencies = None
+    if op is not None:
+        latencies = []
+        for i in np.linspace(0, ops - 1, min(ops, LATENCY_SAMPLES)).astype(int):
+            start = time.perf_counter()
+            op(i)
+            latencies.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return summarize(times, ops, peak / 2**20, latencies)
+
+# Snippet run in a fresh interpreter; prints seconds from import to the first payment
+FIRST_PAYMENT_SNIPPET = (
+    "import time; start = time.perf_counter(); "
+    "from LoanSchedule import MortgagePayment; MortgagePayment(5.5, 25).payments(500000); "
+    "print(time.perf_counter() - start)"
+)
+
+# Function to measure import-to-first-payment latency over `repeat` fresh interpreters
+def measure_first_payment(repeat):
+    here = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", FIRST_PAYMENT_SNIPPET], cwd=here,
+                             capture_output=True, text=True, check=True)
+        times.append(float(out.stdout.strip()))
+    return summarize(times, 1, None)  # Peak memory not measured (separate process)
+
+# Function to run every benchmark for one size; returns {benchmark name: result}
+def run_size(size, repeat):
+    cfg = SIZES[size]
+    results = {}
+
+    loans = synthetic_portfolio(cfg["loans"])
+    rows = list(loans.itertuples(index=False))
+    def payment(l):
+        return MortgagePayment(l.quoted_rate, l.amortization_years).payments(l.principal)
+
+    # Warm: rate factors served from the rate_factors cache after the warm-up run
+    results["payments"] = measure(lambda: [payment(l) for l in rows], len(rows), repeat,
+                                  op=lambda i: payment(rows[i]))
+    # Cold: cache cleared before every run (and before every single-payment sample)
+    results["payments_cold"] = measure(lambda: (rate_factors.cache_clear(), [payment(l) for l in rows]),
+                                       len(rows), repeat,
+                                       op=lambda i: (rate_factors.cache_clear(), payment(rows[i])))
+    results["batch_payments"] = measure(lambda: batch_payments(loans), len(rows), repeat)
+
+    sched_rows = rows[:cfg["schedule_loans"]]
+    sched_ops = [(l, name) for l in sched_rows for name in FREQUENCIES]
+
+    def schedule(task):
+        l, name = task
+        return MortgagePayment(l.quoted_rate, l.amortization_years).build_payment_schedule(l.principal, name)
+
+    results["schedule"] = measure(lambda: [schedule(t) for t in sched_ops], len(sched_ops), repeat,
+                                  op=lambda i: schedule(sched_ops[i]))
+
+    with tempfile.TemporaryDirectory() as folder:
+        files = synthetic_cpi_files(folder, cfg["provinces"], cfg["years"], cfg["items"])
+        file_items = list(files.items())
+        results["load_cpi"] = measure(lambda: load_cpi(files), len(files), repeat,
+                                      op=lambda i: read_cpi_file(*file_items[i]))
+        cpi = load_cpi(files)
+        items = list(cpi["Item"].unique())
+        first, last = cpi["Month"].iloc[0], cpi["Month"].iloc[-1]
+        results["month_change"] = measure(lambda: month_change(cpi, items, first, last), len(cpi), repeat)
+
+    return {"{}/{}".format(name, size): r for name, r in results.items()}
+
+# Peak memory growth below this many MB never counts as a regression (tracemalloc noise on tiny peaks)
+MEMORY_SLACK_MB = 0.5
+
+# Function to compare results with a baseline; returns the list of regressions found
+# A benchmark regresses when its median time, or its peak memory, grows by more than `tolerance`
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue  # New benchmark, nothing to compare
+        ratio = r["median_s"] / base["median_s"]
+        if ratio > 1 + tolerance:
+            regressions.append("{}: {:.1f}% slower ({:.3f} ms -> {:.3f} ms)".format(
+                name, (ratio - 1) * 100, base["median_s"] * 1000, r["median_s"] * 1000))
+        if r["peak_mb"] is not None and base.get("peak_mb") is not None:
+            growth = r["peak_mb"] - base["peak_mb"]
+            if growth > MEMORY_SLACK_MB and r["peak_mb"] > base["peak_mb"] * (1 + tolerance):
+                regressions.append("{}: peak memory {:.1f} MB -> {:.1f} MB".format(name, base["peak_mb"], r["peak_mb"]))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks for LoanSchedule.py and CPI.py")
+    parser.add_argument("--sizes", nargs="+", default=["small", "medium"], choices=list(SIZES))
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark (default: 5)")
+    parser.add_argument("--output", default="bench_results.json", help="JSON file for the results")
+    parser.add_argument("--baseline", help="JSON baseline to compare against")
+    parser.add_argument("--save-baseline", metavar="FILE", help="save the results as a new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown / peak memory growth vs baseline (default: 0.25)")
+    args = parser.parse_args()
+
+    results = {"import_to_first_payment": measure_first_payment(args.repeat)}
+    for size in args.sizes:
+        results.update(run_size(size, args.repeat))
+
+    # Printing the results table
+    print("{:<24} {:>12} {:>10} {:>10} {:>10} {:>10}".format("benchmark", "ops/s", "p50 ms", "p95 ms", "p99 ms", "peak MB"))
+    def cell(value, fmt):
+        return "-" if value is None else fmt.format(value)
+
+    for name, r in results.items():
+        print("{:<24} {:>12.1f} {:>10} {:>10} {:>10} {:>10}".format(
+            name, r["ops_per_s"], cell(r["p50_ms"], "{:.3f}"), cell(r["p95_ms"], "{:.3f}"),
+            cell(r["p99_ms"], "{:.3f}"), cell(r["peak_mb"], "{:.1f}")))
+
+    report = {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "results": results
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nREGRESSIONS (more than {:.0f}% slower or more memory than baseline):".format(args.tolerance * 100))
+            for line in regressions:
+                print("  " + line)
+            sys.exit(1)
+        print("\nNo regressions against", args.baseline)
@@ -2,6 +2,7 @@
 # Outputs for Assignment #2 (Part B):
 #   Printed answers for Questions 1–8, each labeled in the terminal.
 #   Uses pandas library for data loading and calculations.
+#   CPIStore indexes the combined data as a jurisdiction x item x month cube for fast lookups.
 #
 # Data inputs:
 #   - 11 CSV files from Statistics Canada (Canada + 10 provinces) located in 'A2 Data' folder.
@@ -18,9 +19,26 @@
 #   Q8: Identify province with highest Services inflation.
 #
 # Input to program: None required (reads directly from CSV files in 'A2 Data').
+#   Optional flags: --profile-log FILE (per-stage timings as JSON lines), --profile-memory,
+#   --profile-dump FILE (cProfile of the run), --chunksize ROWS (stream the CSV files in chunks).
+#   Parsed files are cached in 'A2 Data/.cpi_cache' and re-parsed only when a CSV changes.
 # Output from program: Printed formatted tables and answers in the terminal.
 
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
+
+import Instrumentation
+from Instrumentation import stage
 
 # Function used to print section headers for output formatting
 def header(title):
@@ -34,43 +52,300 @@ def percent_fmt(x):
     except Exception:
         return ""  # Return a empty string if the conversion fails
 
-# Function to load and normalize the CPI data from multiple CSV files
-def load_cpi(files):
-    out = []  # Using this list to store all the processed dataframes
-    for name, path in files.items():  # Loop through each province and its file path
+# Month label formats seen in StatCan extracts: Jan-24, 24-Jan, 2024-01 (REF_DATE), 2024-01-01
+MONTH_FORMATS = ['%b-%y', '%y-%b', '%Y-%m', '%Y-%m-%d']
+
+# Function to turn one month label into a monthly Period (NaT if it cannot be parsed)
+# Cached, so each distinct label is parsed only once per process
+@lru_cache(maxsize=None)
+def to_month(label):
+    if isinstance(label, (pd.Period, pd.Timestamp)):
+        return pd.Period(label, freq='M')
+    text = str(label).strip()
+    for fmt in MONTH_FORMATS:
         try:
+            return pd.Period(datetime.strptime(text, fmt), freq='M')
+        except ValueError:
+            continue
+    dt = pd.to_datetime(text, errors='coerce')  # Last resort: let pandas infer the format
+    return pd.NaT if pd.isna(dt) else pd.Period(dt, freq='M')
+
+# Function to normalize a column of month labels in one pass over the distinct labels
+# Returns (monthly PeriodArray, 'Jan-24' style labels) aligned with the input
+def normalize_months(values):
+    codes, uniques = pd.factorize(pd.Series(values), use_na_sentinel=True)
+    periods = pd.array([to_month(u) for u in uniques], dtype='period[M]')
+    labels = np.array([p.strftime('%b-%y') if not pd.isna(p) else np.nan for p in periods], dtype=object)
+    if (codes < 0).any():  # Missing labels stay missing
+        periods = pd.array(list(periods) + [pd.NaT], dtype='period[M]')
+        labels = np.append(labels, np.nan)
+    return periods.take(codes), labels[codes]
+
+# Function to get the monthly Period column of a CPI table (computed if the table has none)
+def month_periods(df):
+    if 'Period' in df.columns:
+        return df['Period']
+    return pd.Series(normalize_months(df['Month'])[0], index=df.index)
+
+# Function to read one CPI CSV file and normalize it to the long Item/Month/CPI/Jurisdiction layout
+# plus a 'Period' column (monthly period dtype) parsed once per distinct month label
+# Passing chunksize, items or months switches to the streaming reader (read_cpi_chunks)
+def read_cpi_file(name, path, chunksize=None, items=None, months=None):
+    if chunksize is not None or items is not None or months is not None:
+        return read_cpi_chunks(name, path, chunksize or CHUNK_ROWS, items, months)
+    try:
+        with stage('read_csv') as st:
             df = pd.read_csv(path)  # Read the CSV file
-        except Exception as e:
-            print("Could not read", path, "-", e)  # Print an error message if file read fails
-            continue  # Skip to next file
+            st['file'], st['rows'] = name, len(df)
+    except Exception as e:
+        print("Could not read", path, "-", e)  # Print an error message if file read fails
+        return None  # Caller skips this file
 
+    with stage('melt') as st:
         # First type of CSV structure 'Item' column
         if 'Item' in df.columns:
             # Convert wide format to long format, meaning that columns become 'Month' and values become 'CPI'
             long_df = df.melt(id_vars='Item', var_name='Month', value_name='CPI')
-            # turning month in two possible formats (Jan-24 or 24-Jan)
-            a = pd.to_datetime(long_df['Month'], format='%b-%y', errors='coerce')
-            b = pd.to_datetime(long_df['Month'], format='%y-%b', errors='coerce')
-            m = a.fillna(b)  # Use whichever format succeeded
-            long_df['Month'] = m.dt.strftime('%b-%y')  # Reformat month back to string
-            long_df['Jurisdiction'] = name  # Add province/country name
-            out.append(long_df[['Item','Month','CPI','Jurisdiction']])  # Keep relevant columns
 
         # Second type of CSV structure, uses 'Products and product groups'
         elif 'Products and product groups' in df.columns:
             # Rename columns to standard names
-            df = df.rename(columns={'Products and product groups':'Item','VALUE':'CPI','REF_DATE':'Month'})
-            try:
-                dt = pd.to_datetime(df['Month'], errors='coerce')  # Parse dates if possible
-                df['Month'] = dt.dt.strftime('%b-%y')  # Reformat
-            except Exception:
-                pass  # Ignore errors
-            df['Jurisdiction'] = name  # Tag data with province name
-            out.append(df[['Item','Month','CPI','Jurisdiction']])  # Keep standard columns
+            long_df = df.rename(columns={'Products and product groups':'Item','VALUE':'CPI','REF_DATE':'Month'})
+
+        else:
+            return None  # Unknown layout, nothing to add
+        st['file'], st['rows'] = name, len(long_df)
+
+    # Month labels in any known format (Jan-24, 24-Jan, 2024-01, ...) -> Period and 'Jan-24' label
+    with stage('normalize_months') as st:
+        long_df['Period'], long_df['Month'] = normalize_months(long_df['Month'])
+        st['file'], st['rows'] = name, len(long_df)
+    long_df['Jurisdiction'] = name  # Add province/country name
+    return long_df[['Item','Month','CPI','Jurisdiction','Period']]  # Keep relevant columns
+
+# Rows per chunk for streaming reads (used when filters are given without a chunksize)
+CHUNK_ROWS = 100_000
+
+# Function to build a categorical column with 'string' categories
+# (one explicit dtype for every chunk and both file layouts, so chunks can always be merged)
+def string_categorical(values):
+    return pd.Categorical(pd.Series(values, dtype=object).astype('string'))
+
+# Function to stream one CPI CSV file in chunks of `chunksize` rows with explicit dtypes
+# Only the needed columns are read (month columns outside `months` are skipped in the wide layout),
+# items/months are filtered per chunk, and Item/Month/Jurisdiction come back as categoricals,
+# so peak memory is one raw chunk plus the filtered result, whatever the size of the file
+# Values are read as text and coerced per chunk, so flagged cells (e.g. '134.4A', '..') are
+# dropped one by one exactly as in read_cpi_file
+# Returns the same columns as read_cpi_file (rows in file order, chunk by chunk)
+def read_cpi_chunks(name, path, chunksize=CHUNK_ROWS, items=None, months=None):
+    try:
+        columns = pd.read_csv(path, nrows=0).columns  # Header only, to pick the layout
+    except Exception as e:
+        print("Could not read", path, "-", e)  # Print an error message if file read fails
+        return None  # Caller skips this file
+
+    wanted_items = None if items is None else set(items)
+    wanted_months = None if months is None else {to_month(m) for m in months}
+
+    # First type of CSV structure 'Item' column, one column per month
+    if 'Item' in columns:
+        month_cols = [c for c in columns[columns != 'Item']
+                      if wanted_months is None or to_month(c) in wanted_months]
+        usecols = ['Item'] + month_cols
+        dtype = {c: str for c in usecols}
+        wide = True
+
+    # Second type of CSV structure, uses 'Products and product groups'
+    elif 'Products and product groups' in columns:
+        usecols = ['Products and product groups', 'REF_DATE', 'VALUE']
+        dtype = {'Products and product groups': 'category', 'REF_DATE': 'category', 'VALUE': str}
+        wide = False
+
+    else:
+        return None  # Unknown layout, nothing to add
+
+    parts = []
+    try:
+        reader = pd.read_csv(path, usecols=usecols, dtype=dtype, chunksize=chunksize)
+        for chunk in reader:
+            if wide:
+                chunk = chunk.melt(id_vars='Item', var_name='Month', value_name='CPI')
+            else:
+                chunk = chunk.rename(columns={'Products and product groups':'Item','VALUE':'CPI','REF_DATE':'Month'})
+            cpi = pd.to_numeric(chunk['CPI'], errors='coerce')  # Flagged or empty cells become NaN
+            keep = cpi.notna()
+            if wanted_items is not None:
+                keep &= chunk['Item'].isin(wanted_items)
+            if wanted_months is not None and not wide:  # Wide files only read the wanted month columns
+                # Month filter decided once per distinct label, then indexed by code (-1 = missing label)
+                codes, uniques = pd.factorize(chunk['Month'])
+                keep &= np.append([to_month(u) in wanted_months for u in uniques], False)[codes]
+            chunk, cpi = chunk[keep], cpi[keep]
+            if len(chunk) == 0:
+                continue
+
+            periods, labels = normalize_months(chunk['Month'])
+            if len(chunk) == 0:
+                continue
+
+            parts.append(pd.DataFrame({
+                'Item': string_categorical(chunk['Item']),
+                'Month': string_categorical(labels),
+                'CPI': cpi.to_numpy(dtype=float).round(1),
+                'Jurisdiction': string_categorical([name] * len(chunk)),
+                'Period': periods
+            }))
+    except Exception as e:
+        print("Could not read", path, "-", e)  # Truncated or malformed file
+        return None
+
+    if len(parts) == 0:
+        return None  # Nothing passed the filters
+    with stage('concat_chunks') as st:
+        res = concat_cpi(parts)
+        st['file'], st['chunks'], st['rows'] = name, len(parts), len(res)
+    return res
+
+# Function to concatenate CPI tables whose Item/Month/Jurisdiction are categoricals
+# (plain pd.concat would fall back to object columns when the categories differ)
+# Categories are sorted (months by date), so sorting on these columns matches the plain text columns
+def concat_cpi(frames):
+    res = pd.concat([f[['CPI', 'Period']] for f in frames], ignore_index=True)
+    for pos, col in [(0, 'Item'), (1, 'Month'), (3, 'Jurisdiction')]:
+        res.insert(pos, col, union_categoricals([f[col] for f in frames], sort_categories=True))
+    res['Month'] = res['Month'].cat.reorder_categories(sorted(res['Month'].cat.categories, key=to_month))
+    return res
+
+# Bump when read_cpi_file changes its output so old cache entries are ignored
+CACHE_VERSION = 3
+
+# Function to compute the SHA-1 of a file (used to check a source file really changed)
+def file_hash(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+# Function to build the cache/manifest key of one file (streamed and filtered reads get their own entries)
+def cache_key(name, path, options):
+    key = f"{name}|{os.path.abspath(path)}"
+    if any(v is not None for v in options.values()):
+        items = None if options['items'] is None else sorted(options['items'])
+        months = None if options['months'] is None else sorted(str(to_month(m)) for m in options['months'])
+        key += f"|stream={options['chunksize']}|items={items}|months={months}"  # Row order depends on chunksize
+    return key
+
+# Function to write a cache file atomically: write(temp_path) then rename over `path`,
+# so a process killed mid-write never leaves a truncated file behind
+def atomic_write(path, write):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    os.close(fd)
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+# Function to read one cached table (None if the cache file is missing or unreadable: cache miss)
+def read_cache_file(data_path):
+    try:
+        return pd.read_pickle(data_path)
+    except Exception:
+        return None
+
+# Function to read one CPI file through the on-disk cache in cache_dir
+# The manifest entry records the source file's mtime, size and hash; a file is re-parsed only
+# when its mtime/size changed AND its content hash changed; an unreadable cache file is a cache miss
+# Returns the dataframe and the updated manifest entry (None if nothing could be cached)
+def read_cpi_cached(name, path, cache_dir, entry, options):
+    key = cache_key(name, path, options)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return read_cpi_file(name, path, **options), None  # Missing file: let the normal reader report it
+    data_path = os.path.join(cache_dir, hashlib.sha1(key.encode()).hexdigest() + '.pkl')
+
+    digest = None
+    if entry is not None and os.path.exists(data_path):
+        if entry['mtime'] != st.st_mtime or entry['size'] != st.st_size:
+            digest = file_hash(path)
+        if digest is None or entry['sha1'] == digest:
+            # Unchanged file (no hashing needed) or touched but identical content
+            df = read_cache_file(data_path)
+            if df is not None:
+                return df, {'mtime': st.st_mtime, 'size': st.st_size, 'sha1': entry['sha1']}
+    if digest is None:
+        digest = file_hash(path)
+
+    df = read_cpi_file(name, path, **options)
+    if df is None:
+        return None, None
+    atomic_write(data_path, df.to_pickle)  # Binary cache of the normalized long table
+    return df, {'mtime': st.st_mtime, 'size': st.st_size, 'sha1': digest}
+
+# Function used by load_cpi (and its worker pool) to load one file, with or without the cache
+def load_one(task):
+    name, path, cache_dir, entry, options = task
+    if cache_dir is None:
+        return read_cpi_file(name, path, **options), None
+    return read_cpi_cached(name, path, cache_dir, entry, options)
+
+# Function to load and normalize the CPI data from multiple CSV files
+# If cache_dir is given, parsed files are cached there and only changed files are re-parsed
+# If workers > 1, files are loaded concurrently on a thread pool (or a process pool when
+# use_processes=True); the result keeps the order of `files` either way
+# If chunksize, items or months is given, files are streamed in chunks (read_cpi_chunks): only the
+# listed items/months are kept and Item/Month/Jurisdiction are categoricals, so memory stays
+# bounded by the chunk size and the filtered result rather than by the size of the extracts
+def load_cpi(files, cache_dir=None, workers=None, use_processes=False, chunksize=None, items=None, months=None):
+    options = {'chunksize': chunksize, 'items': items, 'months': months}
+    streaming = any(v is not None for v in options.values())
+    manifest = {}
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        manifest_path = os.path.join(cache_dir, 'cpi_cache.json')
+        try:
+            with open(manifest_path) as f:
+                stored = json.load(f)
+            if stored.get('version') == CACHE_VERSION:
+                manifest = stored['files']
+        except (OSError, ValueError, KeyError):
+            pass  # No usable manifest yet
+
+    keys = [cache_key(name, path, options) for name, path in files.items()]
+    tasks = [(name, path, cache_dir, manifest.get(key), options) for (name, path), key in zip(files.items(), keys)]
+    if workers is not None and workers > 1:
+        pool_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        with pool_class(max_workers=workers) as pool:
+            results = list(pool.map(load_one, tasks))  # map keeps the input order
+    else:
+        results = [load_one(task) for task in tasks]
+
+    out = []  # Using this list to store all the processed dataframes
+    for key, (df, entry) in zip(keys, results):
+        if df is not None:
+            out.append(df)
+        if entry is not None:
+            manifest[key] = entry
+
+    if cache_dir is not None:
+        def write_manifest(tmp):
+            with open(tmp, 'w') as f:
+                json.dump({'version': CACHE_VERSION, 'files': manifest}, f)
+        atomic_write(manifest_path, write_manifest)
 
     # Return empty dataframe if no files were loaded successfully
     if len(out) == 0:
-        return pd.DataFrame(columns=['Item','Month','CPI','Jurisdiction'])
+        return pd.DataFrame({'Item': [], 'Month': [], 'CPI': [], 'Jurisdiction': [],
+                             'Period': pd.array([], dtype='period[M]')})
+
+    # Streamed files are already numeric, rounded and filtered; only the categoricals need merging
+    if streaming:
+        return concat_cpi(out)
 
     # Concatenate all provincial dataframes into one combined dataframe
     res = pd.concat(out, ignore_index=True)
@@ -78,35 +353,150 @@ def load_cpi(files):
     res = res.dropna(subset=['CPI'])  # Remove rows where CPI could not be parsed
     return res  # Return cleaned combined dataset
 
+# Indexed CPI store built from load_cpi output
+# Keeps a dense cube of CPI values (jurisdiction x item x month, months as a monthly PeriodIndex)
+# so point, slice and ratio lookups are array indexing instead of boolean masks over the table
+class CPIStore:
+    def __init__(self, df):
+        # Jurisdictions and items keep their order of first appearance; months are sorted
+        j_codes, self.jurisdictions = pd.factorize(df['Jurisdiction'])
+        i_codes, self.items = pd.factorize(df['Item'])
+        m_codes, months = pd.factorize(pd.PeriodIndex(month_periods(df)), sort=True)
+        self.months = pd.PeriodIndex(months, freq='M')
+
+        # Rows without a usable jurisdiction, item or month (e.g. an 'Annual avg' column) are skipped
+        valid = (j_codes >= 0) & (i_codes >= 0) & (m_codes >= 0)
+        cpi = df['CPI'].to_numpy(dtype=float)[valid]
+
+        # Fill the cube; when a (jurisdiction, item, month) repeats, the first row wins
+        shape = (len(self.jurisdictions), len(self.items), len(self.months))
+        flat = np.ravel_multi_index((j_codes[valid], i_codes[valid], m_codes[valid]), shape)
+        flat, first = np.unique(flat, return_index=True)
+        self.cube = np.full(shape, np.nan)
+        self.cube.ravel()[flat] = cpi[first]
+
+        # Label -> position lookups
+        self.__j = {j: k for k, j in enumerate(self.jurisdictions)}
+        self.__i = {it: k for k, it in enumerate(self.items)}
+        self.__m = {m: k for k, m in enumerate(self.months)}
+
+    def month_index(self, month):
+        # Position of a month given as 'Dec-24' (or another known label), a Period or a Timestamp
+        return self.__m[to_month(month)]
+
+    def has(self, item, *months):
+        # True when the item and every given month are in the store
+        return item in self.__i and all(to_month(m) in self.__m for m in months)
+
+    def value(self, jurisdiction, item, month):
+        # Single CPI value (NaN if missing)
+        return float(self.cube[self.__j[jurisdiction], self.__i[item], self.month_index(month)])
+
+    def series(self, jurisdiction, item, start=None, end=None):
+        # CPI over time for one jurisdiction and item, optionally limited to start..end inclusive
+        lo = 0 if start is None else self.month_index(start)
+        hi = len(self.months) if end is None else self.month_index(end) + 1
+        return pd.Series(self.cube[self.__j[jurisdiction], self.__i[item], lo:hi], index=self.months[lo:hi], name='CPI')
+
+    def cross_section(self, item, month):
+        # CPI of one item in one month for every jurisdiction (missing values dropped)
+        # Empty when the item or the month is not in the store
+        if not self.has(item, month):
+            return pd.Series([], dtype=float, index=self.jurisdictions[:0], name='CPI')
+        values = pd.Series(self.cube[:, self.__i[item], self.month_index(month)], index=self.jurisdictions, name='CPI')
+        return values.dropna()
+
+    def ratio(self, item, month, base):
+        # CPI of every jurisdiction relative to the base jurisdiction (empty if item or month is missing)
+        values = self.cross_section(item, month)
+        if values.empty:
+            return values
+        return values / self.value(base, item, month)
+
+    def change(self, item, start, end):
+        # Percentage change between two months for every jurisdiction (missing values dropped)
+        # Empty when the item or either month is not in the store
+        if not self.has(item, start, end):
+            return pd.Series([], dtype=float, index=self.jurisdictions[:0], name='Change')
+        i = self.__i[item]
+        first = self.cube[:, i, self.month_index(start)]
+        last = self.cube[:, i, self.month_index(end)]
+        return pd.Series((last - first) / first * 100.0, index=self.jurisdictions, name='Change').dropna()
+
+    def month_positions(self, months=None):
+        # Positions of the requested months (all months when None)
+        if months is None:
+            return np.arange(len(self.months))
+        return np.array([self.month_index(m) for m in months], dtype=np.int64)
+
+    def relative_cube(self, item, months=None):
+        # CPI ratio target / base for every month and every pair of jurisdictions, in one broadcast
+        # Returns an array (month, base jurisdiction, target jurisdiction)
+        values = self.cube[:, self.__i[item], self.month_positions(months)].T  # (month, jurisdiction)
+        return values[:, None, :] / values[:, :, None]
+
+    def default_item(self, fallback):
+        # The only item in the store, or the fallback item when there are several
+        return self.items[0] if len(self.items) == 1 else fallback
+
+# Function to accept either a CPI table or an already indexed CPIStore
+def as_store(df):
+    return df if isinstance(df, CPIStore) else CPIStore(df)
+
 # Function to calculate average month-to-month CPI percentage change for selected items
-def month_change(df, items):
-    # Define months to ensure correct ordering
-    months = ['Jan-24','Feb-24','Mar-24','Apr-24','May-24','Jun-24','Jul-24','Aug-24','Sep-24','Oct-24','Nov-24','Dec-24']
-    d = df[df['Month'].isin(months)].copy()  # Keep only relevant months
-    d['Month'] = pd.Categorical(d['Month'], categories=months, ordered=True)  # Keep month order
-
-    rows = []  # Store results
-    for prov in d['Jurisdiction'].unique():  # Loop through provinces
-        for it in items:  # Loop through requested CPI item types
-            tmp = d[(d['Jurisdiction']==prov) & (d['Item']==it)].sort_values('Month')  # Sort by time
-            if tmp.empty:
-                continue  # Skip if no data
-            pct = tmp['CPI'].pct_change() * 100  # Calculate month-to-month percent change
-            avg = round(pct[1:].mean(), 1)  # Compute average change
-            if not pd.isna(avg):
-                rows.append({'Jurisdiction': prov, 'Item': it, 'Change': avg})  # Store result
-    return pd.DataFrame(rows, columns=['Jurisdiction','Item','Change'])  # Return summary dataframe
+# Covers every month from start to end inclusive (labels like 'Jan-24'), in one grouped pass
+def month_change(df, items, start='Jan-24', end='Dec-24'):
+    # Months compared as monthly periods (no string matching)
+    first, last = to_month(start), to_month(end)
+    periods = month_periods(df)
+
+    in_range = (periods >= first) & (periods <= last)  # Keep only relevant months
+    jurisdictions = df.loc[in_range, 'Jurisdiction'].unique()  # Output order of provinces
+    d = df[in_range & df['Item'].isin(items)].copy()
+    d['order'] = periods  # Aligned on the row index
+    d = d.sort_values('order', kind='stable')  # Sort by time within every province/item
+
+    # Month-to-month percent change and its average, per province and item
+    d['pct'] = d.groupby(['Jurisdiction', 'Item'], sort=False)['CPI'].pct_change() * 100
+    avg = d.groupby(['Jurisdiction', 'Item'], sort=False)['pct'].mean().round(1).dropna()
+
+    # Same row order as before: provinces as they appear, then items as requested
+    res = avg.rename('Change').reset_index()
+    # (mapped as plain values: a categorical column would keep its own category order)
+    res['j'] = res['Jurisdiction'].astype(object).map({j: i for i, j in enumerate(jurisdictions)})
+    res['i'] = res['Item'].astype(object).map({it: i for i, it in enumerate(items)})
+    res = res.sort_values(['j', 'i'], kind='stable')
+    return res[['Jurisdiction','Item','Change']].reset_index(drop=True)  # Return summary dataframe
 
 # Function to compute equivalent salaries across provinces using CPI
-def salary_equiv(df_all, base_region, base_amount):
-    dec = df_all[df_all['Month']=='Dec-24']  # Use December data
-    base_cpi = float(dec[dec['Jurisdiction']==base_region]['CPI'].iloc[0])  # Get base region CPI
-    out = []  # Store results
-    for prov in dec['Jurisdiction'].unique():  # Loop through each province
-        cpi_p = float(dec[dec['Jurisdiction']==prov]['CPI'].iloc[0])  # Get province CPI
-        eq = base_amount * (cpi_p / base_cpi)  # Adjust salary by CPI ratio
-        out.append({'Jurisdiction': prov, 'Salary': round(eq, 1)})  # Store equivalent salary
-    return pd.DataFrame(out)  # Return table
+# df_all can be a CPI table (e.g. All-items rows) or a CPIStore
+def salary_equiv(df_all, base_region, base_amount, month='Dec-24', item=None):
+    store = as_store(df_all)
+    item = item or store.default_item('All-items')
+    eq = base_amount * store.ratio(item, month, base_region)  # Adjust salary by CPI ratio
+    return pd.DataFrame({'Jurisdiction': eq.index, 'Salary': eq.round(1).to_numpy()})  # Return table
+
+# Function to compute equivalent salaries for every month, every pair of jurisdictions and
+# every salary level in one broadcast over the CPI cube
+# Returns a long table: Month, Base, Jurisdiction, BaseSalary, Salary (Salary in Jurisdiction
+# buys the same as BaseSalary in Base that month); pairs with missing CPI are dropped
+def salary_equiv_panel(df_all, salaries, item='All-items', months=None):
+    store = as_store(df_all)
+    positions = store.month_positions(months)
+    ratio = store.relative_cube(item, months)  # (month, base, target)
+    salaries = np.asarray(salaries, dtype=float)
+    values = ratio[..., None] * salaries  # (month, base, target, salary)
+
+    shape = values.shape
+    m, b, t, k = np.unravel_index(np.arange(values.size), shape)
+    panel = pd.DataFrame({
+        'Month': store.months[positions][m],
+        'Base': store.jurisdictions[b],
+        'Jurisdiction': store.jurisdictions[t],
+        'BaseSalary': salaries[k],
+        'Salary': values.ravel().round(1)
+    })
+    return panel.dropna(subset=['Salary']).reset_index(drop=True)
 
 # Function to compute CPI-adjusted real minimum wages
 def real_wage(dec_all, mw):
@@ -121,19 +511,64 @@ def real_wage(dec_all, mw):
         top = None
     return m[["Jurisdiction","MinimumWage","Real"]], top  # Return table and best province
 
+# Function to compute real minimum wages for every month (nominal wage / (CPI / 100))
+# Returns a table with months as rows and jurisdictions as columns
+def real_wage_series(df_all, mw, item='All-items', months=None):
+    store = as_store(df_all)
+    positions = store.month_positions(months)
+    wages = mw.drop_duplicates('Jurisdiction').set_index('Jurisdiction')['MinimumWage']
+    wages = wages.reindex(store.jurisdictions).to_numpy(dtype=float)  # NaN where no wage is known
+    cpi = store.cube[:, store.items.get_loc(item), positions]  # (jurisdiction, month)
+    real = (wages[:, None] / (cpi / 100.0)).round(1)
+    table = pd.DataFrame(real.T, index=store.months[positions], columns=store.jurisdictions)
+    return table.dropna(axis=1, how='all')
+
+# Mapping abbreviations to full province names
+JURISDICTION_NAMES = {
+    'AB':'Alberta','BC':'British Columbia','MB':'Manitoba','NB':'New Brunswick',
+    'NL':'Newfoundland and Labrador','NS':'Nova Scotia','ON':'Ontario',
+    'PE':'Prince Edward Island','PEI':'Prince Edward Island','QC':'Quebec',
+    'SK':'Saskatchewan','CANADA':'Canada'
+}
+
+# Function to normalize one province name (cached, so each distinct spelling is handled once)
+@lru_cache(maxsize=None)
+def normalize_jurisdiction(x):
+    s = str(x).strip()
+    up = s.upper()
+    if up in JURISDICTION_NAMES:
+        return JURISDICTION_NAMES[up]
+    if up.startswith('PRINCE EDWARD'):
+        return 'Prince Edward Island'
+    if up.startswith('NEWFOUNDLAND'):
+        return 'Newfoundland and Labrador'
+    return s
+
+# Function to normalize a column of province names (one lookup per distinct value)
+def normalize_jurisdictions(values):
+    codes, uniques = pd.factorize(pd.Series(values))
+    names = np.array([normalize_jurisdiction(u) for u in uniques] + [np.nan], dtype=object)
+    return pd.Series(names[codes], index=getattr(values, 'index', None))
+
 # Function to calculate annual percentage change in Services CPI
-def service_change(df_services):
-    # Take January and December values for comparison
-    jan = df_services[df_services['Month']=='Jan-24'][['Jurisdiction','CPI']].rename(columns={'CPI':'Jan'})
-    dec = df_services[df_services['Month']=='Dec-24'][['Jurisdiction','CPI']].rename(columns={'CPI':'Dec'})
-    # Merge January and December data
-    m = pd.merge(dec, jan, on='Jurisdiction', how='inner')
-    # Compute percentage change over the year
-    m['Change'] = (((m['Dec'] - m['Jan']) / m['Jan']) * 100.0).round(1)
-    return m[['Jurisdiction','Change']]  # Return province and change
+# df_services can be a CPI table (e.g. Services rows) or a CPIStore
+def service_change(df_services, start='Jan-24', end='Dec-24', item=None):
+    store = as_store(df_services)
+    item = item or store.default_item('Services')
+    # Compute percentage change between January and December
+    change = store.change(item, start, end).round(1)
+    return pd.DataFrame({'Jurisdiction': change.index, 'Change': change.to_numpy()})  # Return province and change
 
 # Main program block
 if __name__ == '__main__':
+    # Optional instrumentation flags: --profile-log FILE, --profile-memory, --profile-dump FILE
+    parser = argparse.ArgumentParser(description="CPI analysis (Assignment #2, Part B)")
+    parser.add_argument('--chunksize', type=int, metavar='ROWS',
+                        help="stream the CSV files in chunks of ROWS rows (bounded memory for large extracts)")
+    Instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    Instrumentation.configure_from_args(args)
+
     print("\nPART B: Consumer Price Index (CPI)\n")  # Initial header
 
     # File paths for each region’s CPI data
@@ -153,13 +588,20 @@ if __name__ == '__main__':
 
     # Q1 & Q2: Load and display combined CPI data
     header('Q1 & Q2: Combine CPI files and show first 12 rows')
-    cpi = load_cpi(files)  # Load and merge all CPI data
-    print(cpi.head(12).to_string(index=False))  # Display first 12 rows
+    with stage('load_cpi') as st:
+        cpi = load_cpi(files, cache_dir='A2 Data/.cpi_cache', chunksize=args.chunksize)  # Load and merge all CPI data (cached)
+        st['files'], st['rows'] = len(files), len(cpi)
+    print(cpi[['Item','Month','CPI','Jurisdiction']].head(12).to_string(index=False))  # Display first 12 rows
+    with stage('cpi_store') as st:
+        store = CPIStore(cpi)  # Indexed CPI cube used for the lookups in Q5-Q8
+        st['shape'] = list(store.cube.shape)
 
     # Q3: Average month-to-month CPI change
     header('Q3: Average month-to-month change (Food, Shelter, All-items excl. food & energy)')
     items = ['Food', 'Shelter', 'All-items excluding food and energy']  # Items of interest
-    chg = month_change(cpi, items)  # Calculate average monthly changes
+    with stage('month_change') as st:
+        chg = month_change(cpi, items)  # Calculate average monthly changes
+        st['rows'] = len(chg)
     if not chg.empty:
         chg_print = chg.copy()
         chg_print['Change'] = chg_print['Change'].apply(percent_fmt)  # Format as percentage
@@ -180,10 +622,13 @@ if __name__ == '__main__':
 
     # Q5: Equivalent salary comparison
     header('Q5: Equivalent salary to $100,000 in Ontario (Dec-24 All-items CPI)')
-    all_items = cpi[cpi['Item']=='All-items']  # Filter “All-items” CPI
-    eq = salary_equiv(all_items, 'Ontario', 100000)  # Compute equivalent salaries
-    eq['Salary'] = eq['Salary'].map(lambda x: f"${x:,.1f}")  # Format salary
-    print(eq.to_string(index=False))  # Print table
+    with stage('salary_equiv'):
+        eq = salary_equiv(store, 'Ontario', 100000, item='All-items')  # Compute equivalent salaries
+    if not eq.empty:
+        eq['Salary'] = eq['Salary'].map(lambda x: f"${x:,.1f}")  # Format salary
+        print(eq.to_string(index=False))  # Print table
+    else:
+        print('No Dec-24 All-items data found.')
 
     # Q6: Minimum wage analysis
     header('Q6: Minimum wages nominal & real (Dec-24 CPI)')
@@ -196,35 +641,19 @@ if __name__ == '__main__':
             cols2 = list(mw.columns)[:2]
             mw = mw[cols2].copy()
             mw.columns = ['Jurisdiction','MinimumWage']
-        # Mapping abbreviations to full province names
-        name_map = {
-            'AB':'Alberta','BC':'British Columbia','MB':'Manitoba','NB':'New Brunswick',
-            'NL':'Newfoundland and Labrador','NS':'Nova Scotia','ON':'Ontario',
-            'PE':'Prince Edward Island','PEI':'Prince Edward Island','QC':'Quebec',
-            'SK':'Saskatchewan','CANADA':'Canada'
-        }
-        # Function to normalize province names
-        def norm_j(x):
-            s = str(x).strip()
-            up = s.upper()
-            if up in name_map:
-                return name_map[up]
-            if up.startswith('PRINCE EDWARD'):
-                return 'Prince Edward Island'
-            if up.startswith('NEWFOUNDLAND'):
-                return 'Newfoundland and Labrador'
-            return s
-        mw['Jurisdiction'] = mw['Jurisdiction'].apply(norm_j)  # Apply normalization
+        mw['Jurisdiction'] = normalize_jurisdictions(mw['Jurisdiction'])  # Normalize province names
         mw['MinimumWage'] = mw['MinimumWage'].astype(str).str.replace(r'[^0-9.]','', regex=True)  # Keep only numbers
         mw['MinimumWage'] = pd.to_numeric(mw['MinimumWage'], errors='coerce').round(1)  # Convert to float
         mw = mw.dropna(subset=['MinimumWage'])  # Remove invalid rows
-        dec_all = all_items[all_items['Month']=='Dec-24']  # Get Dec CPI
+        dec_all = store.cross_section('All-items', 'Dec-24').rename_axis('Jurisdiction').reset_index()  # Get Dec CPI
         if dec_all.empty:
             print('Missing Dec-24 All-items CPI; cannot compute real wages.')
         elif mw.empty:
             print('MinimumWages.csv has no numeric wage values after cleaning.')
         else:
-            real_tbl, top_real = real_wage(dec_all, mw)  # Compute real wages
+            with stage('real_wage') as st:
+                real_tbl, top_real = real_wage(dec_all, mw)  # Compute real wages
+                st['rows'] = len(real_tbl)
             if real_tbl.empty:
                 print('No matching provinces between wages and CPI after name normalization.')
                 print('CPI jurisdictions:', sorted(dec_all['Jurisdiction'].unique()))
@@ -253,8 +682,8 @@ if __name__ == '__main__':
 
     # Q7: Annual Services CPI change
     header('Q7: Annual percentage change in Services (Jan-Dec 2024)')
-    services = cpi[cpi['Item']=='Services']  # Select 'Services' data
-    serv = service_change(services)  # Calculate annual change
+    with stage('service_change'):
+        serv = service_change(store, item='Services')  # Calculate annual change
     if not serv.empty:
         serv_print = serv.copy()
         serv_print['Change'] = serv_print['Change'].apply(percent_fmt)  # Format as percent
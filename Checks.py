@@ -0,0 +1,342 @@
+# This program runs regression checks for LoanSchedule.py and CPI.py
+# Outputs:
+#   One line per check (ok / FAIL with the reason); exit code 1 if any check fails
+#
+# Checks (each on small synthetic data written to a temporary folder):
+#   schedule_matches_loop:    build_payment_schedule (closed-form engine) against the original row-by-row
+#                             loop on random loans, tiny principals and the final-payment overshoot branch
+#   streaming_mixed_layouts:  load_cpi(..., chunksize=...) over a wide (Item, 24-Jan, ...) file and a
+#                             REF_DATE/VALUE file together gives the same rows as the default reader
+#   streaming_flagged_cells:  a flagged value cell (e.g. '134.4A') is dropped on its own, in both modes
+#   streaming_category_order: Item/Jurisdiction categories are sorted, Month categories are in date order
+#   scenario_cube_zero_rate:  no NaN in scenario_cube when a shock takes the quoted rate to exactly 0%,
+#                             NaN only where a shock takes the amortization to 0 years or less
+#   cpi_cache_truncated:      a truncated cache file is re-parsed from the CSV instead of failing every load
+#   cpi_missing_data:         service_change / salary_equiv return empty tables when the item or a month is missing
+#   batch_fractional_years:   run_batch keeps fractional amortization (25.5 years = 306 monthly rows)
+#   cpi_unparsed_months:      rows whose month cannot be parsed (an 'Annual avg' column) are skipped by CPIStore
+#   streaming_month_filter:   load_cpi(months=..., items=...) keeps exactly the requested rows in both layouts
+#   schedule_iterators:       iter_payment_schedule (rows and chunks) and balance_at against build_payment_schedule,
+#                             including tiny principals, fractional years and a payoff on a chunk boundary
+#   compact_schedule:         CompactSchedule.to_frame() equals build_payment_schedule exactly in cents mode
+#                             (int32 and, above ~$21M, int64 storage) and __slots__ blocks new attributes
+#   schedule_sinks:           csv / parquet / arrow sinks written in small chunks read back as the
+#                             concatenated schedules (parquet / arrow skipped when pyarrow is missing)
+#   batch_balances:           batch_balances equals batch_schedules(...)["ending_balance"] over the full amortization
+#
+# Usage: python Checks.py [check names ...]
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from LoanSchedule import (FREQUENCIES, SCHEDULE_COLUMNS, MortgagePayment, ScheduleSink, batch_balances, batch_schedules, open_schedule_sink,
+                          rate_factors, run_batch, scenario_cube)
+from CPI import CPIStore, load_cpi, read_cpi_chunks, salary_equiv, service_change
+
+# Function to write a small CPI file in the wide layout (Item, 24-Jan, 24-Feb, ...)
+def write_wide_cpi(path, items, months, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.uniform(100, 200, size=(len(items), len(months))).round(1),
+                      columns=[m.strftime('%y-%b') for m in months])
+    df.insert(0, 'Item', items)
+    df.to_csv(path, index=False)
+    return df
+
+# Function to write a small CPI file in the StatCan REF_DATE/VALUE layout
+def write_ref_date_cpi(path, items, months, seed=1):
+    rng = np.random.default_rng(seed)
+    rows = [{'REF_DATE': m.strftime('%Y-%m'), 'GEO': 'Yukon', 'Products and product groups': item,
+             'UOM': '2002=100', 'VALUE': round(rng.uniform(100, 200), 1)}
+            for m in months for item in items]
+    pd.DataFrame(rows).to_csv(path, index=False)
+
+# Original row-by-row amortization loop, kept as the reference for the closed-form engine
+# Returns the rows (period, starting_balance, interest, payment, ending_balance) rounded to cents
+# and whether the final payment was reduced (overshoot branch)
+def reference_schedule(principal, r, n, payment):
+    rows = []
+    overshoot = False
+    balance = float(principal)
+    period = 1
+    while balance > 0 and period <= n + 1:
+        starting_balance = balance
+        interest = starting_balance * r
+        principal_component = payment - interest
+        # Adjusting the final payment to avoid a negative balance due to rounding
+        if principal_component > balance:
+            principal_component = balance
+            payment_effective = interest + principal_component
+            overshoot = True
+        else:
+            payment_effective = payment
+        ending_balance = starting_balance - principal_component
+        rows.append([period, round(starting_balance, 2), round(interest, 2),
+                     round(payment_effective, 2), round(ending_balance, 2)])
+        balance = ending_balance
+        period += 1
+    return np.array(rows, dtype=float).reshape(-1, 5), overshoot
+
+# Function to compare two CPI tables as sets of (Item, Month, CPI, Jurisdiction, Period) rows
+def same_rows(a, b):
+    cols = ['Item', 'Month', 'CPI', 'Jurisdiction', 'Period']
+    rows_a = sorted(map(tuple, a[cols].astype(object).astype(str).to_numpy()))
+    rows_b = sorted(map(tuple, b[cols].astype(object).astype(str).to_numpy()))
+    return rows_a == rows_b
+
+MONTHS = pd.period_range('2024-01', periods=12, freq='M')
+ITEMS = ['All-items', 'Food', 'Shelter', 'Services', 'Energy', 'Goods', 'Transportation']
+
+def check_streaming_mixed_layouts(folder):
+    write_wide_cpi(os.path.join(folder, 'ON.csv'), ITEMS, MONTHS)
+    write_ref_date_cpi(os.path.join(folder, 'YT.csv'), ITEMS, MONTHS)
+    files = {'Ontario': os.path.join(folder, 'ON.csv'), 'Yukon': os.path.join(folder, 'YT.csv')}
+    full = load_cpi(files)
+    streamed = load_cpi(files, chunksize=5)
+    wide, ref_date = read_cpi_chunks('Ontario', files['Ontario'], 5), read_cpi_chunks('Yukon', files['Yukon'], 5)
+    for col in ['Item', 'Month', 'Jurisdiction']:
+        assert wide[col].cat.categories.dtype == ref_date[col].cat.categories.dtype, col
+    assert len(full) == 2 * len(ITEMS) * len(MONTHS), len(full)
+    assert same_rows(full, streamed), "streamed rows differ from the default reader"
+
+def check_streaming_flagged_cells(folder):
+    df = write_wide_cpi(os.path.join(folder, 'ON.csv'), ITEMS, MONTHS).astype(object)
+    df.iloc[1, 3] = '134.4A'  # Flagged value: only this cell should be dropped
+    df.to_csv(os.path.join(folder, 'ON.csv'), index=False)
+    files = {'Ontario': os.path.join(folder, 'ON.csv')}
+    full = load_cpi(files)
+    streamed = load_cpi(files, chunksize=4)
+    assert len(full) == len(ITEMS) * len(MONTHS) - 1, len(full)
+    assert same_rows(full, streamed), "streamed rows differ from the default reader"
+
+def check_streaming_category_order(folder):
+    files = {}
+    for k, name in enumerate(['Quebec', 'Alberta', 'Canada']):
+        files[name] = os.path.join(folder, name + '.csv')
+        write_wide_cpi(files[name], ITEMS[::-1], MONTHS, seed=k)
+    streamed = load_cpi(files, chunksize=3)
+    assert list(streamed['Item'].cat.categories) == sorted(ITEMS)
+    assert list(streamed['Jurisdiction'].cat.categories) == sorted(files)
+    assert [pd.Period(m, freq='M') for m in pd.to_datetime(streamed['Month'].cat.categories, format='%b-%y')] == list(MONTHS)
+    expected = load_cpi(files).sort_values(['Item', 'Period'], kind='stable')['CPI'].to_numpy()
+    assert (streamed.sort_values(['Item', 'Period'], kind='stable')['CPI'].to_numpy() == expected).all()
+
+def check_schedule_matches_loop(folder):
+    rng = np.random.default_rng(0)
+    loans = [(0.01, 5.0, 1), (1.0, 3.0, 2), (100.0, 7.5, 5), (500000, 5.5, 25), (500000, 5.5, 25.5)]
+    loans += [(round(rng.uniform(1000, 2000000), 2), round(rng.uniform(0.5, 12), 2), int(rng.choice([5, 10, 25, 30])))
+              for _ in range(60)]
+    overshoots = 0
+    for principal, rate, years in loans:
+        for name in FREQUENCIES:
+            r, n, factor = rate_factors(rate, years, name)
+            expected, overshoot = reference_schedule(principal, r, n, principal * factor)
+            got = MortgagePayment(rate, years).build_payment_schedule(principal, name).to_numpy(dtype=float)
+            overshoots += overshoot
+            # The loop may end with one extra all-zero row left by a floating-point residue
+            if len(expected) == len(got) + 1:
+                assert (expected[-1, 1:] == 0).all(), (principal, rate, years, name, expected[-1])
+                expected = expected[:-1]
+            assert len(expected) == len(got), (principal, rate, years, name, len(expected), len(got))
+            assert np.abs(expected - got).max() <= 0.01 + 1e-9, (principal, rate, years, name)
+    assert overshoots > 0, "no schedule exercised the final-payment overshoot branch"
+
+def check_scenario_cube_zero_rate(folder):
+    cube = scenario_cube([300000, 200000], [2.0, 5.5], [25, 25], [5, 5], rate_shocks_bp=range(-200, 401, 50),
+                         amortization_changes=(-5, 0, 5), prepayment=(0.0, 0.1))
+    assert not np.isnan(cube["payment"]).any() and not np.isnan(cube["balance_at_term"]).any()
+    # 2.0% - 200bp = 0%: straight-line repayment, 60 of 300 monthly payments made after 5 years
+    s = cube["scenarios"]
+    zero = s.index[(s["rate_shock_bp"] == -200) & (s["amortization_change"] == 0) & (s["prepayment"] == 0)][0]
+    assert np.isclose(cube["payment"][0, zero, 0], 1000.0)
+    assert np.isclose(cube["balance_at_term"][0, zero, 0], 240000.0)
+    # Shocked amortization of 0 years or less is reported as NaN instead of being replaced by 1 year
+    cube = scenario_cube([300000, 200000], [5.0, 5.0], [5, 25], [5, 5], amortization_changes=(-10, -5, 0))
+    assert np.isnan(cube["payment"][0, :2]).all() and np.isnan(cube["balance_at_term"][0, :2]).all()
+    assert not np.isnan(cube["payment"][0, 2]).any() and not np.isnan(cube["payment"][1]).any()
+
+def check_cpi_cache_truncated(folder):
+    write_wide_cpi(os.path.join(folder, 'ON.csv'), ITEMS, MONTHS)
+    files = {'Ontario': os.path.join(folder, 'ON.csv')}
+    cache_dir = os.path.join(folder, 'cache')
+    expected = load_cpi(files, cache_dir=cache_dir)
+    for entry in os.listdir(cache_dir):
+        if entry.endswith('.pkl'):  # Simulate a process killed while writing the cache
+            with open(os.path.join(cache_dir, entry), 'r+b') as f:
+                f.truncate(50)
+    assert same_rows(load_cpi(files, cache_dir=cache_dir), expected)
+    assert same_rows(load_cpi(files, cache_dir=cache_dir), expected)  # Cache rewritten
+    assert not [e for e in os.listdir(cache_dir) if e.endswith('.tmp')]
+
+def check_cpi_missing_data(folder):
+    write_wide_cpi(os.path.join(folder, 'ON.csv'), ITEMS, MONTHS[:11])  # No Dec-24
+    write_wide_cpi(os.path.join(folder, 'QC.csv'), ITEMS, MONTHS[:11], seed=1)
+    cpi = load_cpi({'Ontario': os.path.join(folder, 'ON.csv'), 'Quebec': os.path.join(folder, 'QC.csv')})
+    store = CPIStore(cpi)
+    for table in [service_change(store), service_change(store, item='Missing', end='Nov-24'),
+                  salary_equiv(store, 'Ontario', 100000), salary_equiv(cpi, 'Ontario', 100000, item='Missing')]:
+        assert table.empty and len(table.columns) == 2, table
+    assert len(service_change(store, end='Nov-24')) == 2
+    assert len(salary_equiv(store, 'Ontario', 100000, month='Nov-24')) == 2
+
+def check_batch_fractional_years(folder):
+    loans = pd.DataFrame({'loan_id': ['a', 'b'], 'principal': [500000, 250000],
+                          'quoted_rate': [5.5, 4.0], 'amortization_years': [25.5, 20]})
+    loans.to_csv(os.path.join(folder, 'loans.csv'), index=False)
+    out_dir = os.path.join(folder, 'out')
+    run_batch(os.path.join(folder, 'loans.csv'), out_dir, workers=1, excel=False, plot=False, fmt='csv')
+    table = pd.read_csv(os.path.join(out_dir, 'schedules.csv'))
+    for loan_id, principal, rate, years in loans[['loan_id', 'principal', 'quoted_rate', 'amortization_years']].itertuples(index=False):
+        for name in FREQUENCIES:
+            got = table[(table['loan_id'] == loan_id) & (table['frequency'] == name)]
+            expected = MortgagePayment(rate, years).build_payment_schedule(principal, name)
+            assert len(got) == len(expected), (loan_id, name, len(got), len(expected))
+            assert np.allclose(got[expected.columns].to_numpy(dtype=float), expected.to_numpy(dtype=float))
+    assert len(table[(table['loan_id'] == 'a') & (table['frequency'] == 'Monthly')]) == 306
+
+def check_cpi_unparsed_months(folder):
+    df = write_wide_cpi(os.path.join(folder, 'ON.csv'), ITEMS, MONTHS)
+    df['Annual avg'] = df.iloc[:, 1:].mean(axis=1).round(1)  # Numeric column that is not a month
+    df.to_csv(os.path.join(folder, 'ON.csv'), index=False)
+    write_wide_cpi(os.path.join(folder, 'QC.csv'), ITEMS, MONTHS, seed=1)
+    cpi = load_cpi({'Ontario': os.path.join(folder, 'ON.csv'), 'Quebec': os.path.join(folder, 'QC.csv')})
+    store = CPIStore(cpi)
+    assert list(store.months) == list(MONTHS)
+    assert store.value('Ontario', 'Food', 'Dec-24') == df.loc[df['Item'] == 'Food', '24-Dec'].iloc[0]
+    assert len(salary_equiv(cpi, 'Ontario', 100000, item='All-items')) == 2
+    assert len(service_change(store)) == 2
+
+def check_streaming_month_filter(folder):
+    write_wide_cpi(os.path.join(folder, 'ON.csv'), ITEMS, MONTHS)
+    write_ref_date_cpi(os.path.join(folder, 'YT.csv'), ITEMS, MONTHS)
+    files = {'Ontario': os.path.join(folder, 'ON.csv'), 'Yukon': os.path.join(folder, 'YT.csv')}
+    full = load_cpi(files)
+    wanted = full[full['Month'].isin(['Mar-24', 'Dec-24']) & full['Item'].isin(['Food', 'Energy'])]
+    streamed = load_cpi(files, chunksize=5, items=['Food', 'Energy'], months=['Mar-24', '2024-12'])
+    assert len(wanted) == 8 and same_rows(wanted, streamed)
+
+def check_schedule_iterators(folder):
+    loans = [(0.01, 5.0, 1), (500000, 5.5, 25.5), (250000, 4.0, 5), (1234567.89, 7.25, 30)]
+    for principal, rate, years in loans:
+        mortgage = MortgagePayment(rate, years)
+        for name in FREQUENCIES:
+            expected = mortgage.build_payment_schedule(principal, name)
+            rows = pd.DataFrame(list(mortgage.iter_payment_schedule(principal, name)), columns=expected.columns)
+            assert rows.equals(expected), (principal, rate, years, name, 'rows')
+            # 60 monthly periods for the 5-year loan: chunks of 20 and 60 end exactly at the payoff
+            for chunk_size in (7, 20, 60, 5000):
+                chunks = list(mortgage.iter_payment_schedule(principal, name, chunk_size))
+                assert all(len(c) <= chunk_size for c in chunks)
+                chunked = pd.concat(chunks, ignore_index=True)
+                assert chunked.equals(expected), (principal, rate, years, name, chunk_size)
+            # balance_at(k) is the ending balance of period k (the principal for k = 0, 0 once paid off)
+            k = np.arange(len(expected) + 2)
+            balances = np.array([mortgage.balance_at(principal, name, int(i)) for i in k])
+            assert abs(balances[0] - principal) < 1e-6
+            assert np.abs(np.round(balances[1:len(expected) + 1], 2) - expected['ending_balance'].to_numpy()).max() <= 0.01
+            assert (balances[len(expected):] == 0).all()
+
+def check_compact_schedule(folder):
+    rng = np.random.default_rng(1)
+    loans = [(0.01, 5.0, 1), (500000, 5.5, 25.5), (25_000_000, 6.0, 30)]
+    loans += [(round(rng.uniform(1000, 2000000), 2), round(rng.uniform(0.5, 12), 2), int(rng.choice([5, 25, 30])))
+              for _ in range(20)]
+    for principal, rate, years in loans:
+        mortgage = MortgagePayment(rate, years)
+        for name in FREQUENCIES:
+            compact = mortgage.compact_schedule(principal, name)
+            expected = mortgage.build_payment_schedule(principal, name)
+            assert len(compact) == len(expected)
+            assert compact.to_frame().equals(expected), (principal, rate, years, name)
+            for money in ('float32', 'float64'):
+                other = mortgage.compact_schedule(principal, name, money).to_frame()
+                assert np.abs(other.to_numpy() - expected.to_numpy()).max() <= max(0.01, principal * 1e-6)
+    big = MortgagePayment(6.0, 30).compact_schedule(25_000_000, 'Monthly')
+    assert big.ending_balance.dtype == np.int64  # 2.5 billion cents does not fit in int32
+    small = MortgagePayment(6.0, 30).compact_schedule(500000, 'Monthly')
+    assert small.ending_balance.dtype == np.int32
+    try:
+        small.notes = 'x'
+    except AttributeError:
+        pass
+    else:
+        raise AssertionError('CompactSchedule accepted a new attribute')
+    assert not hasattr(small, '__dict__')
+
+def check_schedule_sinks(folder):
+    schedules = []
+    for loan_id, (principal, rate, years) in enumerate([(500000, 5.5, 25), (0.01, 5.0, 1), (250000, 4.0, 5.5)]):
+        mortgage = MortgagePayment(rate, years)
+        for name in FREQUENCIES:
+            df = mortgage.build_payment_schedule(principal, name)
+            df.insert(0, 'frequency', name)
+            df.insert(0, 'loan_id', 'loan_{}'.format(loan_id))
+            schedules.append(df)
+    expected = pd.concat(schedules, ignore_index=True)
+
+    try:
+        import pyarrow  # noqa: F401  Optional dependency of the parquet / arrow sinks
+        formats = ['csv', 'parquet', 'arrow']
+    except ImportError:
+        formats = ['csv']
+    readers = {'csv': pd.read_csv, 'parquet': pd.read_parquet, 'arrow': pd.read_feather}
+    for fmt in formats:
+        path = os.path.join(folder, 'schedules.' + fmt)
+        with open_schedule_sink(path, fmt, chunk_rows=100) as sink:
+            for df in schedules:
+                sink.write(df['loan_id'].iloc[0], df['frequency'].iloc[0], df.drop(columns=['loan_id', 'frequency']))
+        assert sink.rows_written == len(expected), (fmt, sink.rows_written)
+        got = readers[fmt](path)
+        assert list(got.columns) == list(expected.columns), fmt
+        assert (got['loan_id'].astype(str) == expected['loan_id']).all() and (got['frequency'].astype(str) == expected['frequency']).all()
+        assert np.array_equal(got[SCHEDULE_COLUMNS].to_numpy(dtype=float), expected[SCHEDULE_COLUMNS].to_numpy(dtype=float)), fmt
+
+    try:
+        ScheduleSink(os.path.join(folder, 'x'))
+    except TypeError:
+        pass  # Abstract: _write_chunk must be implemented
+    else:
+        raise AssertionError('ScheduleSink can be instantiated without _write_chunk')
+
+def check_batch_balances(folder):
+    loans = pd.DataFrame({'principal': [500000, 0.01, 250000, 900000], 'quoted_rate': [5.5, 5.0, 0.0, 7.0],
+                          'amortization_years': [25, 1, 5.5, 30], 'term_years': [5, 1, 2, 3]})
+    for name in FREQUENCIES:
+        got = batch_balances(loans, frequency_name=name)  # term_years column is ignored
+        expected = batch_schedules(loans.drop(columns='term_years'), frequency_name=name)['ending_balance']
+        assert got.shape == expected.shape, (name, got.shape, expected.shape)
+        assert np.array_equal(np.isnan(got), np.isnan(expected)), name
+        assert np.allclose(np.nan_to_num(got), np.nan_to_num(expected), rtol=0, atol=1e-6), name
+
+CHECKS = {
+    'schedule_matches_loop': check_schedule_matches_loop,
+    'streaming_mixed_layouts': check_streaming_mixed_layouts,
+    'streaming_flagged_cells': check_streaming_flagged_cells,
+    'streaming_category_order': check_streaming_category_order,
+    'scenario_cube_zero_rate': check_scenario_cube_zero_rate,
+    'cpi_cache_truncated': check_cpi_cache_truncated,
+    'cpi_missing_data': check_cpi_missing_data,
+    'batch_fractional_years': check_batch_fractional_years,
+    'cpi_unparsed_months': check_cpi_unparsed_months,
+    'streaming_month_filter': check_streaming_month_filter,
+    'schedule_iterators': check_schedule_iterators,
+    'compact_schedule': check_compact_schedule,
+    'schedule_sinks': check_schedule_sinks,
+    'batch_balances': check_batch_balances
+}
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(CHECKS)
+    failed = 0
+    for name in names:
+        with tempfile.TemporaryDirectory() as folder:
+            try:
+                CHECKS[name](folder)
+                print(f"ok    {name}")
+            except Exception as e:
+                failed += 1
+                print(f"FAIL  {name}: {type(e).__name__}: {e}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,127 @@
+# Lightweight, opt-in instrumentation shared by the LoanSchedule.py and CPI.py pipelines
+#
+# Stage timers:
+#   with stage("load_cpi") as s:
+#       df = load_cpi(files)
+#       s["rows"] = len(df)          # optional extra fields (row counts, file names, ...)
+#
+# Every stage emits one JSON line with: event, stage, seconds, peak_mb (tracemalloc
+# high-water mark during the stage, when memory tracking is on), max_rss_mb and any extra fields.
+# Nothing is measured or written until configure() is called, so the timers cost ~nothing
+# when instrumentation is off.
+#
+# configure(path, memory, profile_path):
+#   path          JSON-lines file ("-" for stderr, None for no log)
+#   memory        also track Python memory high-water marks with tracemalloc (slower)
+#   profile_path  dump a cProfile of the whole run to this file (readable with pstats / snakeviz),
+#                 or a pyinstrument HTML report if the file name ends in .html
+#
+# add_arguments(parser) / configure_from_args(args) wire the --profile-log, --profile-memory and
+# --profile-dump flags into a command line program.
+
+import atexit
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource  # Not available on Windows
+except ImportError:
+    resource = None
+
+# Current settings (None while instrumentation is off)
+_settings = None
+
+# Function to read the process peak resident memory in MB (None if unknown)
+def max_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return rss / 2**20 if sys.platform == "darwin" else rss / 2**10
+
+# Function to write one JSON line to the configured output
+def emit(event, **fields):
+    if _settings is None:
+        return
+    record = {"event": event, "time": time.time()}
+    record.update(fields)
+    out = _settings["out"]
+    if out is None:
+        return
+    out.write(json.dumps(record, default=str) + "\n")
+    out.flush()
+
+# Function to turn instrumentation on
+def configure(path="-", memory=False, profile_path=None):
+    global _settings
+    if path is None:
+        out = None
+    elif path == "-":
+        out = sys.stderr
+    else:
+        out = open(path, "a")
+    _settings = {"out": out, "memory": memory}
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    if profile_path is not None:
+        if profile_path.endswith(".html"):
+            from pyinstrument import Profiler  # Optional dependency
+            profiler = Profiler()
+            profiler.start()
+
+            def dump():
+                profiler.stop()
+                with open(profile_path, "w") as f:
+                    f.write(profiler.output_html())
+        else:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+            def dump():
+                profiler.disable()
+                profiler.dump_stats(profile_path)
+        atexit.register(dump)
+
+    start = time.perf_counter()
+    emit("start", argv=sys.argv)
+    atexit.register(lambda: emit("end", seconds=time.perf_counter() - start, max_rss_mb=max_rss_mb()))
+
+# Stage timer (context manager); yields a dict for extra fields such as row counts
+@contextmanager
+def stage(name):
+    fields = {}
+    if _settings is None:
+        yield fields
+        return
+    if _settings["memory"]:
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        record = {"stage": name, "seconds": time.perf_counter() - start}
+        if _settings["memory"]:
+            record["peak_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+        record["max_rss_mb"] = max_rss_mb()
+        record.update(fields)
+        emit("stage", **record)
+
+# Function to add the instrumentation flags to an argparse parser
+def add_arguments(parser):
+    group = parser.add_argument_group("instrumentation")
+    group.add_argument("--profile-log", metavar="FILE",
+                       help="write per-stage timings as JSON lines to FILE ('-' for stderr)")
+    group.add_argument("--profile-memory", action="store_true",
+                       help="with --profile-log, also record memory high-water marks per stage (tracemalloc, slower)")
+    group.add_argument("--profile-dump", metavar="FILE",
+                       help="dump a cProfile of the run to FILE (pyinstrument HTML if FILE ends in .html)")
+
+# Function to turn instrumentation on from parsed command line arguments
+def configure_from_args(args):
+    if args.profile_log or args.profile_dump:
+        configure(args.profile_log, args.profile_memory, args.profile_dump)
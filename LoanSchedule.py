@@ -13,20 +13,406 @@
 #   build_payment_schedule(principal, frequency_name):
 #       returns a pandas DataFrame with columns:
 #           period, starting_balance, interest, payment, ending_balance
+#       (thin wrapper over amortization_arrays, the closed-form NumPy engine)
+#   iter_payment_schedule(principal, frequency_name, chunk_size):
+#       lazily yields schedule rows (or DataFrame blocks of chunk_size rows)
+#   balance_at(principal, frequency_name, k):
+#       ending balance after period k, without materializing the schedule
+#   compact_schedule(principal, frequency_name, money):
+#       CompactSchedule (typed arrays, __slots__) with a DataFrame view via to_frame()
 #
-# Input to program (via input()):
+# Rates and annuity factors are memoized per (rate, amortization, frequency) by rate_factors,
+# so a payment for any principal costs one multiply once the factor is cached
+#
+# Batch functions (vectorized across loans, arrays or a DataFrame of loans):
+#   batch_payments(principal, quoted_rate, amortization_years):
+#       returns an array (loans x 6) of payment amounts in the same order as payments()
+#   batch_schedules(principal, quoted_rate, amortization_years, frequency_name, term_years, padded):
+#       returns padded 2-D schedule arrays (or a ragged list of per-loan arrays)
+#   batch_balances(principal, quoted_rate, amortization_years, frequency_name):
+#       returns only the 2-D ending-balance grid over the full amortization
+#   scenario_cube(principal, quoted_rate, amortization_years, term_years, rate_shocks_bp,
+#                 amortization_changes, prepayment, workers):
+#       payments and balance at term for every (loan x scenario x frequency)
+#
+# Input to program (flags --principal/--rate/--amortization/--term, a --config JSON file,
+# or via input() for any value not given):
 #   Principal amount (float)
 #   Quoted interest rate in percent (float)
 #   Amortization period in years (int)
 #   Term in years (int)
+# --no-excel / --no-plot skip those outputs
+# --plot-points N downsamples the figure lines (LTTB); --plot-format / --portfolio-plot for --batch
+#
+# pandas, matplotlib and the Excel writer are imported lazily inside the functions that use them,
+# so importing this module for payments() only loads NumPy
+#
+# Batch mode (no prompts): python LoanSchedule.py --batch loans.csv --workers 4 --out-dir schedules
+#   one workbook and one PNG per loan, built on a process pool, plus a loans/sec report
+#   --format csv/parquet/arrow/feather writes one long table (loan_id, frequency, period, ...)
+#   incrementally through a ScheduleSink instead (open_schedule_sink for library use)
+#
+# Instrumentation (both modes): --profile-log FILE writes per-stage timings as JSON lines,
+#   --profile-memory adds memory high-water marks, --profile-dump FILE saves a cProfile
 #
 # Output from program:
 #   Printed six payment amounts rounded to 2 decimals
+#   Printed balance at the end of the term for each payment option
 #   Excel file with six worksheets saved as: A2_PartA_Schedules.xlsx
 #   PNG figure saved as: A2_PartA_BalanceDecline.png
 
-import pandas as pd
-import matplotlib.pyplot as plt
+import argparse
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+
+import Instrumentation
+from Instrumentation import stage
+
+# Column order used by every amortization schedule
+SCHEDULE_COLUMNS = ["period", "starting_balance", "interest", "payment", "ending_balance"]
+
+# A balance counts as paid off below half a cent (it prints as 0.00), or below a millionth of the
+# principal for loans under $5,000 so tiny loans are not cut short (a $0.01 loan keeps all its periods)
+# The closed form leaves a floating-point residue of about 1e-9 at the last period; the old row-by-row
+# loop turned a positive residue into one extra all-zero row (payment 0.00, balance 0.00). Treating
+# the residue as paid off drops that row, so schedules can be one row shorter than the old loop's
+PAID_OFF_TOLERANCE = 0.005
+PAID_OFF_RELATIVE = 1e-6
+
+def _paid_off_tolerance(principal):
+    # Paid-off threshold for each loan (same shape as principal)
+    return np.minimum(PAID_OFF_TOLERANCE, PAID_OFF_RELATIVE * np.abs(principal))
+
+# The six payment options, in the same order as payments() returns them
+# name -> (payments per year, divisor applied to the monthly payment for rapid options)
+FREQUENCIES = {
+    "Monthly": (12, None),
+    "Semi-monthly": (24, None),
+    "Bi-weekly": (26, None),
+    "Weekly": (52, None),
+    "Rapid Bi-weekly": (26, 2),
+    "Rapid Weekly": (52, 4)
+}
+
+def _balance_after(principal, r, payment, k):
+    # Balance after k level payments, arrays broadcast against each other
+    #   principal * (1 + r)^k - payment * ((1 + r)^k - 1) / r, or principal - payment * k when r is 0
+    growth = (1 + r) ** k
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(r == 0, principal - payment * k, principal * growth - payment * (growth - 1) / r)
+
+def _annuity_factor(r, n):
+    # Payment per dollar of principal for n periods at periodic rate r (1 / n when r is 0)
+    # Scalars in -> float out, arrays in -> array out
+    r = np.asarray(r, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factor = np.where(r == 0, 1 / np.asarray(n, dtype=float), r / (1 - (1 + r) ** -np.asarray(n)))
+    return factor if factor.ndim else float(factor)
+
+def _amortization_grid(principal, r, n, payment, max_periods, first_period=0):
+    # Closed-form amortization engine shared by single, batch and streaming schedules
+    # principal, r, n, payment are 1-D arrays with one entry per loan
+    # Balance after k payments of a level annuity:
+    #   B_k = principal * (1 + r)^k - payment * ((1 + r)^k - 1) / r
+    # Covers periods first_period + 1 .. first_period + max_periods
+    # Returns 2-D arrays (loan x period) padded past each loan's last period, plus the lengths
+    k = np.arange(first_period, first_period + max_periods + 1)
+    balance = _balance_after(principal[:, None], r[:, None], payment[:, None], k)
+
+    # Each schedule stops at the first period whose ending balance is paid off,
+    # and never runs past n + 1 periods (same protection against rounding as before)
+    paid = balance[:, 1:] < _paid_off_tolerance(principal)[:, None]
+    last = np.where(paid.any(axis=1), paid.argmax(axis=1) + 1, max_periods)
+    last = np.minimum(last, n + 1 - first_period).astype(np.int64)
+
+    starting_balance = balance[:, :-1]
+    interest = starting_balance * r[:, None]
+    payments = np.repeat(payment[:, None], max_periods, axis=1).astype(float)
+    ending_balance = balance[:, 1:].copy()
+
+    # Adjusting the final payment to avoid a negative balance due to rounding
+    rows = np.arange(len(last))
+    final = last - 1
+    is_paid = paid[rows, final]
+    overshoot = is_paid & (ending_balance[rows, final] < 0)
+    payments[rows[overshoot], final[overshoot]] = interest[rows[overshoot], final[overshoot]] + starting_balance[rows[overshoot], final[overshoot]]
+    ending_balance[rows[is_paid], final[is_paid]] = 0.0
+
+    return {
+        "period": np.broadcast_to(k[1:], ending_balance.shape),
+        "starting_balance": starting_balance,
+        "interest": interest,
+        "payment": payments,
+        "ending_balance": ending_balance
+    }, last
+
+def amortization_arrays(principal, r, n, payment):
+    # Closed-form amortization schedule for one loan (NumPy, no per-period Python loop)
+    # Returns a dict of arrays keyed by SCHEDULE_COLUMNS (values not rounded)
+    grid, last = _amortization_grid(np.array([float(principal)]), np.array([float(r)]),
+                                    np.array([n]), np.array([float(payment)]), int(n) + 1)
+    return {col: grid[col][0, :last[0]].copy() for col in SCHEDULE_COLUMNS}
+
+def balance_closed_form(principal, r, payment, k):
+    # Balance after k payments (scalar or array k), 0 once the loan is paid off
+    balance = _balance_after(principal, r, payment, np.asarray(k))
+    return np.where(balance < _paid_off_tolerance(principal), 0.0, balance)
+
+def _loan_columns(principal, quoted_rate=None, amortization_years=None, term_years=None):
+    # Accepts either four array-likes or one DataFrame with columns
+    # principal, quoted_rate, amortization_years and (optionally) term_years
+    if hasattr(principal, "columns"):  # DataFrame of loans
+        loans = principal
+        principal = loans["principal"]
+        quoted_rate = loans["quoted_rate"]
+        amortization_years = loans["amortization_years"]
+        term_years = loans["term_years"] if "term_years" in loans.columns else None
+    principal = np.asarray(principal, dtype=float).ravel()
+    quoted_rate = np.broadcast_to(np.asarray(quoted_rate, dtype=float), principal.shape)
+    # Years are kept as given (25.5 years = 306 monthly periods), never truncated
+    amortization_years = np.broadcast_to(np.asarray(amortization_years, dtype=float), principal.shape)
+    if term_years is not None:
+        term_years = np.broadcast_to(np.asarray(term_years, dtype=float), principal.shape)
+    return principal, quoted_rate, amortization_years, term_years
+
+def _frequency_terms(quoted_rate, amortization_years, frequency_name):
+    # Periodic rate, number of periods and payment per dollar of principal
+    # Works on scalars or on arrays with one entry per loan
+    if frequency_name not in FREQUENCIES:
+        raise ValueError("Unknown name")
+    periods_per_year, rapid_divisor = FREQUENCIES[frequency_name]
+    # In Canada, mortgage rates are quoted as semi-annually compounded
+    # So first convert the semi-annual rate to an effective annual rate (EAR)
+    EAR = (1 + quoted_rate / 200) ** 2 - 1
+    r = (1 + EAR) ** (1 / periods_per_year) - 1
+    n = amortization_years * periods_per_year
+    if rapid_divisor is None:
+        # Annuity factor: payment = principal * [r / (1 - (1 + r)^-n)]
+        factor = _annuity_factor(r, n)
+    else:
+        # rapid amounts are a fraction of the monthly amount
+        r_monthly = (1 + EAR) ** (1 / 12) - 1
+        n_months = amortization_years * 12
+        factor = _annuity_factor(r_monthly, n_months) / rapid_divisor
+    return r, n, factor
+
+# Maximum number of (rate, amortization, frequency) entries kept by rate_factors
+FACTOR_CACHE_SIZE = 4096
+
+@lru_cache(maxsize=FACTOR_CACHE_SIZE)
+def rate_factors(quoted_rate, amortization_years, frequency_name):
+    # Memoized (periodic rate, number of periods, annuity factor) for one frequency
+    # Least recently used entries are evicted once FACTOR_CACHE_SIZE is reached;
+    # rate_factors.cache_info() reports hits/misses and rate_factors.cache_clear() resets it
+    # Amortization is kept as given (25.5 years = 306 monthly periods), never truncated
+    return _frequency_terms(float(quoted_rate), float(amortization_years), frequency_name)
+
+def batch_payments(principal, quoted_rate=None, amortization_years=None):
+    # Six payment amounts for many loans at once, vectorized across loans
+    # Accepts arrays (or scalars broadcast to the principal) or a DataFrame of loans
+    # Returns an array of shape (number of loans, 6), columns in FREQUENCIES order
+    principal, quoted_rate, amortization_years, _ = _loan_columns(principal, quoted_rate, amortization_years)
+    out = np.empty((principal.size, len(FREQUENCIES)))
+    for j, name in enumerate(FREQUENCIES):
+        _, _, factor = _frequency_terms(quoted_rate, amortization_years, name)
+        out[:, j] = principal * factor
+    return out
+
+def batch_schedules(principal, quoted_rate=None, amortization_years=None, frequency_name="Monthly",
+                    term_years=None, padded=True):
+    # Schedules for many loans at once for one payment frequency
+    # If term_years is given, each schedule is cut at the end of its term
+    # padded=True: dict of 2-D arrays (loan x period) keyed by SCHEDULE_COLUMNS, plus "length";
+    #   money columns are NaN and period is 0 past each loan's last period
+    #   (memory is loans x longest schedule x 8 bytes per column, so chunk very large books)
+    # padded=False: ragged list with one dict of 1-D arrays per loan
+    principal, quoted_rate, amortization_years, term_years = _loan_columns(
+        principal, quoted_rate, amortization_years, term_years)
+    r, n, factor = _frequency_terms(quoted_rate, amortization_years, frequency_name)
+    max_periods = int(n.max()) + 1 if n.size else 0
+    grid, last = _amortization_grid(principal, r, n, principal * factor, max_periods)
+    if term_years is not None:
+        last = np.minimum(last, np.floor(term_years * FREQUENCIES[frequency_name][0])).astype(np.int64)
+
+    if not padded:
+        return [{col: grid[col][i, :last[i]].copy() for col in SCHEDULE_COLUMNS} for i in range(len(last))]
+
+    width = int(last.max()) if last.size else 0
+    valid = np.arange(1, width + 1) <= last[:, None]
+    out = {"period": np.where(valid, grid["period"][:, :width], 0)}
+    for col in SCHEDULE_COLUMNS[1:]:
+        out[col] = np.where(valid, grid[col][:, :width], np.nan)
+    out["length"] = last
+    return out
+
+def batch_balances(principal, quoted_rate=None, amortization_years=None, frequency_name="Monthly"):
+    # Ending balance after every period for many loans, over the full amortization (no term cut)
+    # Same values as batch_schedules(...)["ending_balance"] with term_years=None, but only this one
+    # loan x period grid is built (NaN past each loan's last period)
+    principal, quoted_rate, amortization_years, _ = _loan_columns(principal, quoted_rate, amortization_years)
+    r, n, factor = _frequency_terms(quoted_rate, amortization_years, frequency_name)
+    max_periods = int(n.max()) + 1 if n.size else 0
+    k = np.arange(1, max_periods + 1)
+    balance = _balance_after(principal[:, None], r[:, None], (principal * factor)[:, None], k)
+    paid = balance < _paid_off_tolerance(principal)[:, None]
+    last = np.where(paid.any(axis=1), paid.argmax(axis=1) + 1, max_periods)
+    last = np.minimum(last, n + 1).astype(np.int64)
+    balance[paid] = 0.0  # Only the final period can be paid off inside a loan's schedule
+    balance[k > last[:, None]] = np.nan
+    width = int(last.max()) if last.size else 0
+    return balance[:, :width]
+
+def scenario_grid(rate_shocks_bp=(0,), amortization_changes=(0,), prepayment=(0.0,)):
+    # Every combination of rate shock (basis points), amortization change (years) and prepayment
+    # (extra fraction of the regular payment paid every period, e.g. 0.1 = 10% more)
+    import pandas as pd
+    index = pd.MultiIndex.from_product([rate_shocks_bp, amortization_changes, prepayment],
+                                       names=["rate_shock_bp", "amortization_change", "prepayment"])
+    return index.to_frame(index=False)
+
+def _scenario_chunk(task):
+    # Worker for scenario_cube: evaluates one block of loans against every scenario
+    principal, quoted_rate, amortization_years, term_years, shocks, amort_changes, prepay = task
+    # Shocked inputs, shape (loans, scenarios)
+    rate = quoted_rate[:, None] + shocks[None, :] / 100.0
+    years = amortization_years[:, None] + amort_changes[None, :]
+    invalid = years <= 0  # Amortization shocked to zero or below: reported as NaN
+    years = np.where(invalid, 1.0, years)  # Placeholder so the factor math stays finite
+
+    # Rate factors are computed once per distinct (rate, amortization) pair and shared
+    pairs, inverse = np.unique(np.column_stack([rate.ravel(), years.ravel()]), axis=0, return_inverse=True)
+    inverse = inverse.reshape(rate.shape)
+    pair_rate, pair_years = pairs[:, 0], pairs[:, 1]
+
+    shape = rate.shape + (len(FREQUENCIES),)
+    payment = np.empty(shape)
+    balance = np.empty(shape)
+    for j, (name, (periods_per_year, _)) in enumerate(FREQUENCIES.items()):
+        r, _, factor = _frequency_terms(pair_rate, pair_years, name)
+        r, factor = r[inverse], factor[inverse]
+        payment[:, :, j] = principal[:, None] * factor
+        # Balance at the end of the term with the prepayment added to every payment
+        k = np.floor(term_years * periods_per_year)[:, None]  # Whole payments made during the term
+        paid = payment[:, :, j] * (1 + prepay[None, :])
+        balance[:, :, j] = balance_closed_form(principal[:, None], r, paid, k)
+    payment[invalid] = np.nan
+    balance[invalid] = np.nan
+    return payment, balance
+
+def scenario_cube(principal, quoted_rate=None, amortization_years=None, term_years=None,
+                  rate_shocks_bp=(0,), amortization_changes=(0,), prepayment=(0.0,),
+                  workers=None, chunk_loans=50000):
+    # Stress engine: payments and balance at term over the full (loan x scenario x frequency) cube
+    # Loans: arrays or a DataFrame (principal, quoted_rate, amortization_years, term_years)
+    # Scenarios: scenario_grid(rate_shocks_bp, amortization_changes, prepayment)
+    # Returns a dict with
+    #   "scenarios": DataFrame describing each scenario (row s = scenario index s)
+    #   "payment": regular payment, array (loans, scenarios, 6) in FREQUENCIES order
+    #   "balance_at_term": balance after term_years with the prepayment applied, same shape
+    # Cells whose shocked amortization is zero or negative (e.g. 5 years with a -5 change) are NaN
+    # Loans are processed in blocks of chunk_loans; workers > 1 spreads the blocks over a process pool
+    principal, quoted_rate, amortization_years, term_years = _loan_columns(
+        principal, quoted_rate, amortization_years, term_years)
+    if term_years is None:
+        raise ValueError("term_years is required for balance at term")
+    scenarios = scenario_grid(rate_shocks_bp, amortization_changes, prepayment)
+    shocks = scenarios["rate_shock_bp"].to_numpy(dtype=float)
+    amort_changes = scenarios["amortization_change"].to_numpy(dtype=float)
+    prepay = scenarios["prepayment"].to_numpy(dtype=float)
+
+    tasks = [(principal[i:i + chunk_loans], quoted_rate[i:i + chunk_loans], amortization_years[i:i + chunk_loans],
+              term_years[i:i + chunk_loans], shocks, amort_changes, prepay)
+             for i in range(0, principal.size, chunk_loans)]
+    results = list(_ordered_map(_scenario_chunk, tasks, workers or 1))
+    if not results:
+        empty = np.empty((0, len(scenarios), len(FREQUENCIES)))
+        return {"scenarios": scenarios, "payment": empty, "balance_at_term": empty.copy()}
+    return {
+        "scenarios": scenarios,
+        "payment": np.concatenate([p for p, _ in results]),
+        "balance_at_term": np.concatenate([b for _, b in results])
+    }
+
+class CompactSchedule:
+    # Memory-light amortization schedule backed by contiguous typed arrays
+    # Only the interest and ending balance are stored per period; the period number, starting
+    # balance (previous ending balance) and payment (constant except the last one) are derived.
+    # money:
+    #   "cents"   exact cents in int32 (int64 if a balance exceeds about $21 million), default
+    #   "float32" dollars in float32 (about 7 significant digits, so not cent-exact above ~$100,000)
+    #   "float64" dollars in float64
+    # Use to_frame() for the usual DataFrame (period, starting_balance, interest, payment, ending_balance)
+    # Measured footprint (tracemalloc) for a 30-year weekly schedule (1,560 periods):
+    #   build_payment_schedule DataFrame ~66 KB; CompactSchedule ~12.9 KB (cents or float32),
+    #   ~25 KB (float64); i.e. about 8 bytes per period instead of ~42
+    __slots__ = ("frequency_name", "money", "principal", "payment", "final_payment", "interest", "ending_balance")
+
+    def __init__(self, cols, frequency_name, money="cents"):
+        # cols: dict of arrays keyed by SCHEDULE_COLUMNS (e.g. from amortization_arrays)
+        if money not in ("cents", "float32", "float64"):
+            raise ValueError("Unknown money type: {}".format(money))
+        self.frequency_name = frequency_name
+        self.money = money
+        # Scalars kept as plain Python numbers (already rounded to cents)
+        self.principal = round(float(cols["starting_balance"][0]), 2)
+        self.payment = round(float(cols["payment"][0]), 2)
+        self.final_payment = round(float(cols["payment"][-1]), 2)
+        self.interest = self.__encode(cols["interest"])
+        self.ending_balance = self.__encode(cols["ending_balance"])
+
+    def __encode(self, values):
+        dollars = np.round(np.asarray(values, dtype=float), 2)
+        if self.money == "cents":
+            cents = np.rint(dollars * 100)
+            dtype = np.int32 if np.abs(cents).max(initial=0) < 2**31 else np.int64
+            return np.ascontiguousarray(cents, dtype=dtype)
+        return np.ascontiguousarray(dollars, dtype=self.money)
+
+    def __decode(self, values):
+        if self.money == "cents":
+            return values / 100.0
+        return values.astype(float)
+
+    def __len__(self):
+        return len(self.ending_balance)
+
+    @property
+    def nbytes(self):
+        # Bytes held by the per-period arrays (the scalars are a few dozen bytes more)
+        return self.interest.nbytes + self.ending_balance.nbytes
+
+    @property
+    def period(self):
+        return np.arange(1, len(self) + 1)
+
+    @property
+    def starting_balance(self):
+        ending = self.__decode(self.ending_balance)
+        return np.concatenate(([self.principal], ending[:-1]))
+
+    @property
+    def payment_column(self):
+        payments = np.full(len(self), self.payment)
+        if len(self):
+            payments[-1] = self.final_payment
+        return payments
+
+    def to_frame(self):
+        # DataFrame view with the same columns as build_payment_schedule
+        import pandas as pd
+        return pd.DataFrame({
+            "period": self.period,
+            "starting_balance": self.starting_balance,
+            "interest": self.__decode(self.interest),
+            "payment": self.payment_column,
+            "ending_balance": self.__decode(self.ending_balance)
+        }, columns=SCHEDULE_COLUMNS)
 
 class MortgagePayment:
     def __init__(self, quoted_rate, amortization_years):
@@ -36,138 +422,474 @@ class MortgagePayment:
         self.__amortization_years = amortization_years
 
     def payments(self, principal):
-        # Convert quoted rate to effective annual rate (EAR)
-        # In Canada, mortgage rates are quoted as semi-annually compounded
-        # So first convert the semi-annual rate to an effective annual rate
-        EAR = (1 + self.__quoted_rate / 200) ** 2 - 1
+        # Each payment is the principal times a cached annuity factor (see rate_factors)
+        # Rapid bi-weekly / rapid weekly are half / one-quarter of the monthly payment
+        # Return all payment values as a tuple in order
+        return tuple(principal * self.__factors(name)[2] for name in FREQUENCIES)
 
-        # MONTHLY PAYMENT
-        # Calculate the monthly periodic rate based on EAR
-        r_monthly = (1 + EAR) ** (1 / 12) - 1
-        # Total number of monthly payments (years * 12 months)
-        n_months = self.__amortization_years * 12
-        # Apply annuity formula: P = principal * [r / (1 - (1 + r)^-n)]
-        monthly = principal * (r_monthly / (1 - (1 + r_monthly) ** -n_months))
-
-        # SEMI-MONTHLY PAYMENT (24 per year)
-        # There are 24 semi-monthly payments per year (2 per month)
-        r_semi_monthly = (1 + EAR) ** (1 / 24) - 1
-        n_semi_monthly = self.__amortization_years * 24
-        semi_monthly = principal * (r_semi_monthly / (1 - (1 + r_semi_monthly) ** -n_semi_monthly))
-
-        # BI-WEEKLY PAYMENT (26 per year)
-        # There are 26 bi-weekly payments in a year (every two weeks)
-        r_bi_weekly = (1 + EAR) ** (1 / 26) - 1
-        n_bi_weekly = self.__amortization_years * 26
-        bi_weekly = principal * (r_bi_weekly / (1 - (1 + r_bi_weekly) ** -n_bi_weekly))
-
-        # WEEKLY PAYMENT (52 per year)
-        # There are 52 weekly payments per year
-        r_weekly = (1 + EAR) ** (1 / 52) - 1
-        n_weekly = self.__amortization_years * 52
-        weekly = principal * (r_weekly / (1 - (1 + r_weekly) ** -n_weekly))
-
-        # RAPID PAYMENTS
-        # Rapid payments are based on dividing the monthly payment:
-        #   Rapid bi-weekly = half of monthly
-        #   Rapid weekly = one-quarter of monthly
-        rapid_bi_weekly = monthly / 2
-        rapid_weekly = monthly / 4
+    def __factors(self, frequency_name):
+        # Cached periodic rate, number of periods and annuity factor for this mortgage
+        return rate_factors(self.__quoted_rate, self.__amortization_years, frequency_name)
 
-        # Return all payment values as a tuple in order
-        return (monthly, semi_monthly, bi_weekly, weekly, rapid_bi_weekly, rapid_weekly)
+    def iter_payment_schedule(self, principal, frequency_name, chunk_size=None):
+        # Lazy version of build_payment_schedule, memory stays constant in the schedule length
+        # chunk_size=None: yields one row dict per period (money rounded to cents)
+        # chunk_size=k: yields DataFrames of up to k periods with the usual columns
+        import pandas as pd
+        r, n, factor = self.__factors(frequency_name)
+        payment = principal * factor
+        block = chunk_size or 256
+        first_period = 0
+        while first_period < n + 1:
+            grid, last = _amortization_grid(np.array([float(principal)]), np.array([r]), np.array([n]),
+                                            np.array([payment]), block, first_period)
+            cols = {col: grid[col][0, :last[0]] for col in SCHEDULE_COLUMNS}
+            df = pd.DataFrame({
+                "period": cols["period"],
+                "starting_balance": np.round(cols["starting_balance"], 2),
+                "interest": np.round(cols["interest"], 2),
+                "payment": np.round(cols["payment"], 2),
+                "ending_balance": np.round(cols["ending_balance"], 2)
+            }, columns=SCHEDULE_COLUMNS)
+            if chunk_size:
+                yield df
+            else:
+                yield from df.to_dict("records")
+            # Stopping once the loan is paid off (the engine sets that final balance to exactly 0)
+            if last[0] < block or cols["ending_balance"][-1] == 0.0:
+                return
+            first_period += block
+
+    def balance_at(self, principal, frequency_name, k):
+        # Ending balance after period k (k = 0 gives the principal) without building any rows,
+        # e.g. the balance at the end of the term is balance_at(principal, name, term_years * periods per year)
+        r, n, factor = self.__factors(frequency_name)
+        return float(balance_closed_form(principal, r, principal * factor, k))
+
+    def compact_schedule(self, principal, frequency_name, money="cents"):
+        # Same schedule as build_payment_schedule, stored as a CompactSchedule
+        r, n, factor = self.__factors(frequency_name)
+        return CompactSchedule(amortization_arrays(principal, r, n, principal * factor), frequency_name, money)
 
     def build_payment_schedule(self, principal, frequency_name):
         # Build a schedule for the selected payment frequency
         # Returns a pandas DataFrame with the required columns
-        EAR = (1 + self.__quoted_rate / 200) ** 2 - 1
-
-        # Mapping frequency to periods per year and periodic rate
-        if frequency_name == "Monthly":
-            periods_per_year = 12
-            r = (1 + EAR) ** (1 / 12) - 1
-            n = self.__amortization_years * periods_per_year
-            payment = principal * (r / (1 - (1 + r) ** -n))
-        elif frequency_name == "Semi-monthly":
-            periods_per_year = 24
-            r = (1 + EAR) ** (1 / 24) - 1
-            n = self.__amortization_years * periods_per_year
-            payment = principal * (r / (1 - (1 + r) ** -n))
-        elif frequency_name == "Bi-weekly":
-            periods_per_year = 26
-            r = (1 + EAR) ** (1 / 26) - 1
-            n = self.__amortization_years * periods_per_year
-            payment = principal * (r / (1 - (1 + r) ** -n))
-        elif frequency_name == "Weekly":
-            periods_per_year = 52
-            r = (1 + EAR) ** (1 / 52) - 1
-            n = self.__amortization_years * periods_per_year
-            payment = principal * (r / (1 - (1 + r) ** -n))
-        elif frequency_name == "Rapid Bi-weekly":
-            periods_per_year = 26
-            r = (1 + EAR) ** (1 / 26) - 1
-            n = self.__amortization_years * periods_per_year
-            # rapid amount is half of monthly amount
-            r_monthly = (1 + EAR) ** (1 / 12) - 1
-            n_months = self.__amortization_years * 12
-            monthly_amt = principal * (r_monthly / (1 - (1 + r_monthly) ** -n_months))
-            payment = monthly_amt / 2
-        elif frequency_name == "Rapid Weekly":
-            periods_per_year = 52
-            r = (1 + EAR) ** (1 / 52) - 1
-            n = self.__amortization_years * periods_per_year
-            # rapid amount is one-quarter of monthly amount
-            r_monthly = (1 + EAR) ** (1 / 12) - 1
-            n_months = self.__amortization_years * 12
-            monthly_amt = principal * (r_monthly / (1 - (1 + r_monthly) ** -n_months))
-            payment = monthly_amt / 4
-        else:
-            # If there is an unknown name provided
-            raise ValueError("Unknown name")
-
-        # Building rows until the balance reaches zero (protect against rounding)
-        rows = []
-        balance = float(principal)
-        period = 1
-        while balance > 0 and period <= n + 1:
-            starting_balance = balance
-            interest = starting_balance * r
-            principal_component = payment - interest
-            # Adjusting the final payment to avoid a negative balance due to rounding
-            if principal_component > balance:
-                principal_component = balance
-                payment_effective = interest + principal_component
-            else:
-                payment_effective = payment
-            ending_balance = starting_balance - principal_component
-
-            rows.append({
-                "period": period,
-                "starting_balance": round(starting_balance, 2),
-                "interest": round(interest, 2),
-                "payment": round(payment_effective, 2),
-                "ending_balance": round(ending_balance, 2)
-            })
-
-            balance = ending_balance
-            period += 1
-
-        # Creating DataFrame with specified column order
-        df = pd.DataFrame(rows, columns=["period", "starting_balance", "interest", "payment", "ending_balance"])
+        import pandas as pd
+        r, n, factor = self.__factors(frequency_name)
+        payment = principal * factor
+
+        # Computing every period at once with the closed-form engine
+        cols = amortization_arrays(principal, r, n, payment)
+
+        # Creating DataFrame with specified column order (money rounded to cents)
+        df = pd.DataFrame({
+            "period": cols["period"],
+            "starting_balance": np.round(cols["starting_balance"], 2),
+            "interest": np.round(cols["interest"], 2),
+            "payment": np.round(cols["payment"], 2),
+            "ending_balance": np.round(cols["ending_balance"], 2)
+        }, columns=SCHEDULE_COLUMNS)
         return df
 
+def write_schedules_excel(schedules, path):
+    # Save schedules (dict: frequency name -> DataFrame) to one Excel file, one worksheet each
+    import pandas as pd
+    with pd.ExcelWriter(path, engine="xlsxwriter") as writer:
+        for name, df_sched in schedules.items():
+            # Replace spaces with underscore for sheet name; ensure <=31 chars
+            sheet_name = name.replace(" ", "_")[:31]
+            df_sched.to_excel(writer, sheet_name=sheet_name, index=False)
+
+def lttb_indices(values, n_out):
+    # Largest-Triangle-Three-Buckets downsampling: indices of n_out points that keep the visual
+    # shape of the series (first and last points always kept)
+    n = len(values)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    y = np.asarray(values, dtype=float)
+    x = np.arange(n, dtype=float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)  # n_out - 2 buckets between the ends
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (the last point for the final bucket)
+        nlo, nhi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        # Keep the point forming the largest triangle with the previous kept point and that average
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+def _new_figure():
+    # Figure drawn with the Agg backend directly (no pyplot state, safe in worker processes)
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    return fig
+
+def plot_balance_decline(balances, path, max_points=None, dpi=200):
+    # Ploting the balance decline (dict: frequency name -> ending balances) on one figure
+    # max_points: downsample each line with LTTB to at most this many points before rendering
+    # The output type follows the file extension: .png (raster), .svg/.pdf (vector),
+    # or .csv/.json (data only: the plotted points, nothing is rendered)
+    points = {}
+    for name, values in balances.items():
+        values = np.asarray(values, dtype=float)
+        keep = lttb_indices(values, max_points) if max_points else np.arange(len(values))
+        points[name] = (keep, values[keep])
+
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".json":
+        with open(path, "w") as f:
+            json.dump({name: {"period": (k + 1).tolist(), "ending_balance": v.tolist()} for name, (k, v) in points.items()}, f)
+        return
+    if ext == ".csv":
+        with open(path, "w") as f:
+            f.write("frequency,period,ending_balance\n")
+            for name, (k, v) in points.items():
+                f.writelines("{},{},{:.2f}\n".format(name, i + 1, b) for i, b in zip(k, v))
+        return
+
+    fig = _new_figure()
+    ax = fig.add_subplot()
+    for name, (k, v) in points.items():
+        ax.plot(k, v, label=name)
+    ax.set_title("Loan Balance Decline by Payment Frequency")
+    ax.set_xlabel("Period")
+    ax.set_ylabel("Ending Balance ($)")
+    ax.legend()
+    fig.tight_layout()
+    fig.savefig(path, dpi=dpi)
+
+def plot_portfolio_bands(ending_balances, path, title="Portfolio Balance Decline",
+                         percentiles=(5, 25, 50, 75, 95), dpi=200):
+    # Percentile bands of the balance across a portfolio instead of one line per loan
+    # ending_balances: 2-D array (loan x period), e.g. batch_schedules(...)["ending_balance"];
+    # NaN padding past a loan's last period counts as a paid-off (zero) balance
+    balances = np.nan_to_num(np.asarray(ending_balances, dtype=float), nan=0.0)
+    bands = np.percentile(balances, percentiles, axis=0)
+    periods = np.arange(1, balances.shape[1] + 1)
+
+    fig = _new_figure()
+    ax = fig.add_subplot()
+    half = len(percentiles) // 2
+    for i in range(half):
+        # Outer bands lighter, inner bands darker
+        ax.fill_between(periods, bands[i], bands[-1 - i], alpha=0.15 + 0.2 * i, color="tab:blue", linewidth=0,
+                        label="{}-{}th percentile".format(percentiles[i], percentiles[-1 - i]))
+    if len(percentiles) % 2:
+        ax.plot(periods, bands[half], color="tab:blue", label="{}th percentile".format(percentiles[half]))
+    ax.set_title(title)
+    ax.set_xlabel("Period")
+    ax.set_ylabel("Ending Balance ($)")
+    ax.legend()
+    fig.tight_layout()
+    fig.savefig(path, dpi=dpi)
+
+def _render_figure(job):
+    # Worker for render_figures: job = (plot function, output path, args, kwargs)
+    fn, path, args, kwargs = job
+    fn(*args, path=path, **kwargs)
+    return path
+
+def render_figures(jobs, workers=None):
+    # Render many figures, in parallel on a process pool of `workers` processes when workers > 1
+    # (in this process when workers is not given or there is only one job)
+    # jobs: list of (plot function, output path, args, kwargs), where the function is a module-level
+    # function taking a `path` argument, e.g. (plot_portfolio_bands, "bands.png", (balances,), {})
+    # Returns the output paths in job order
+    workers = 1 if workers is None or len(jobs) <= 1 else workers
+    return list(_ordered_map(_render_figure, jobs, workers))
+
+# Columns of the long schedule table written by the columnar sinks
+LONG_COLUMNS = ["loan_id", "frequency"] + SCHEDULE_COLUMNS
+
+class ScheduleSink(ABC):
+    # Pluggable output for many schedules: one long table keyed by loan_id and frequency
+    # Rows are buffered and flushed every `chunk_rows` rows, so the whole table never has
+    # to fit in memory. Use as a context manager or call close() when done.
+    # Subclasses implement _write_chunk (and _close if they hold a file or writer)
+    def __init__(self, path, chunk_rows=65536):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.rows_written = 0
+        self._buffer = []
+        self._buffered = 0
+
+    def write(self, loan_id, frequency_name, df_sched):
+        # Queue one schedule DataFrame (columns SCHEDULE_COLUMNS) for output
+        chunk = df_sched[SCHEDULE_COLUMNS].copy()
+        chunk.insert(0, "frequency", frequency_name)
+        chunk.insert(0, "loan_id", str(loan_id))
+        self._buffer.append(chunk)
+        self._buffered += len(chunk)
+        if self._buffered >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        import pandas as pd
+        if self._buffer:
+            chunk = pd.concat(self._buffer, ignore_index=True)
+            self._write_chunk(chunk)
+            self.rows_written += len(chunk)
+        self._buffer = []
+        self._buffered = 0
+
+    def close(self):
+        self.flush()
+        self._close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @abstractmethod
+    def _write_chunk(self, chunk):
+        # Write one DataFrame of LONG_COLUMNS rows
+        ...
+
+    def _close(self):
+        pass
+
+class CSVScheduleSink(ScheduleSink):
+    # Chunked CSV: header once, then appended blocks of rows
+    def __init__(self, path, chunk_rows=65536):
+        super().__init__(path, chunk_rows)
+        self._file = open(path, "w", newline="")
+        self._header = True
+
+    def _write_chunk(self, chunk):
+        chunk.to_csv(self._file, header=self._header, index=False)
+        self._header = False
+
+    def _close(self):
+        self._file.close()
+
+def _import_pyarrow():
+    # pyarrow is only needed for the Parquet and Arrow sinks
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError("Parquet/Arrow output requires pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+class ParquetScheduleSink(ScheduleSink):
+    # Parquet file, one row group per flushed chunk
+    def __init__(self, path, chunk_rows=65536):
+        super().__init__(path, chunk_rows)
+        self._pa = _import_pyarrow()
+        import pyarrow.parquet
+        self._writer = None
+
+    def _write_chunk(self, chunk):
+        table = self._pa.Table.from_pandas(chunk, preserve_index=False)
+        if self._writer is None:
+            self._writer = self._pa.parquet.ParquetWriter(self.path, table.schema)
+        self._writer.write_table(table)
+
+    def _close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+class ArrowScheduleSink(ScheduleSink):
+    # Arrow IPC file (same format as Feather v2), record batches written per flushed chunk;
+    # readers can memory-map it, e.g. pyarrow.ipc.open_file(pyarrow.memory_map(path))
+    def __init__(self, path, chunk_rows=65536):
+        super().__init__(path, chunk_rows)
+        self._pa = _import_pyarrow()
+        import pyarrow.ipc
+        self._writer = None
+
+    def _write_chunk(self, chunk):
+        table = self._pa.Table.from_pandas(chunk, preserve_index=False)
+        if self._writer is None:
+            self._writer = self._pa.ipc.new_file(self.path, table.schema)
+        self._writer.write_table(table)
+
+    def _close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+# Output format name -> (sink class, file extension)
+SINKS = {
+    "csv": (CSVScheduleSink, ".csv"),
+    "parquet": (ParquetScheduleSink, ".parquet"),
+    "arrow": (ArrowScheduleSink, ".arrow"),
+    "feather": (ArrowScheduleSink, ".feather")
+}
+
+def open_schedule_sink(path, fmt=None, chunk_rows=65536):
+    # Open a sink by format name, or guess the format from the file extension
+    if fmt is None:
+        ext = os.path.splitext(path)[1].lower()
+        fmt = next((name for name, (_, sink_ext) in SINKS.items() if sink_ext == ext), None)
+    if fmt not in SINKS:
+        raise ValueError("Unknown output format: {}".format(fmt))
+    return SINKS[fmt][0](path, chunk_rows)
+
+def build_loan_schedules(task):
+    # Worker for columnar batch output: six schedules for one loan
+    # task = (loan_id, principal, quoted_rate, amortization_years)
+    loan_id, principal, rate, years = task
+    mortgage = MortgagePayment(rate, years)
+    return loan_id, {name: mortgage.build_payment_schedule(principal, name) for name in FREQUENCIES}
+
+def build_loan_outputs(task):
+    # Worker for the batch mode: builds six schedules for one loan and writes its files
+    # task = (loan_id, principal, quoted_rate, amortization_years, out_dir, excel, plot, plot_points, plot_format)
+    # Returns the list of files written (top-level so a process pool can pickle it)
+    loan_id, principal, rate, years, out_dir, excel, plot, plot_points, plot_format = task
+    mortgage = MortgagePayment(rate, years)
+    schedules = {name: mortgage.build_payment_schedule(principal, name) for name in FREQUENCIES}
+    written = []
+    if excel:
+        path = os.path.join(out_dir, "{}_Schedules.xlsx".format(loan_id))
+        write_schedules_excel(schedules, path)
+        written.append(path)
+    if plot:
+        path = os.path.join(out_dir, "{}_BalanceDecline.{}".format(loan_id, plot_format))
+        plot_balance_decline({name: df["ending_balance"].values for name, df in schedules.items()}, path, plot_points)
+        written.append(path)
+    return written
+
+def _ordered_map(fn, tasks, workers):
+    # Apply fn to every task, on a process pool when workers > 1; results keep task order
+    if workers == 1:
+        for task in tasks:
+            yield fn(task)
+        return
+    chunksize = max(1, len(tasks) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(fn, tasks, chunksize=chunksize)
+
+def run_batch(input_path, out_dir, workers=None, excel=True, plot=True, fmt="xlsx",
+              plot_points=None, plot_format="png", portfolio_plot=False):
+    # Batch mode: one workbook and one figure per loan in a CSV file of loans
+    # (or, with fmt = csv / parquet / arrow / feather, one long table schedules.<ext>)
+    # Input columns: principal, quoted_rate, amortization_years and optionally loan_id
+    # Output names are <loan_id>_Schedules.xlsx / <loan_id>_BalanceDecline.<plot_format>, where loan_id
+    # defaults to loan_000001, loan_000002, ... in file order
+    # plot_points downsamples each figure line (LTTB); portfolio_plot adds one percentile-band
+    # figure per frequency (portfolio_<frequency>.png) across all loans over the full amortization,
+    # rendered in parallel
+    # Loans are spread over a process pool of `workers` processes (default: all cores);
+    # results come back in input order, so the output is deterministic
+    import pandas as pd
+    if fmt != "xlsx" and fmt not in SINKS:
+        raise ValueError("Unknown output format: {}".format(fmt))
+    with stage("read_loans") as s:
+        loans = pd.read_csv(input_path)
+        s["rows"] = len(loans)
+    if "loan_id" in loans.columns:
+        loan_ids = loans["loan_id"].astype(str)
+    else:
+        loan_ids = ["loan_{:06d}".format(i + 1) for i in range(len(loans))]
+    os.makedirs(out_dir, exist_ok=True)
+    columns = zip(loan_ids, loans["principal"], loans["quoted_rate"], loans["amortization_years"])
+
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    if fmt == "xlsx":
+        tasks = [(loan_id, float(p), float(r), float(y), out_dir, excel, plot, plot_points, plot_format)
+                 for loan_id, p, r, y in columns]
+        with stage("schedules_excel_plot") as s:
+            results = list(_ordered_map(build_loan_outputs, tasks, workers))
+            s["loans"], s["workers"] = len(tasks), workers
+    else:
+        # Columnar formats: one long table, written as each loan's schedules arrive
+        tasks = [(loan_id, float(p), float(r), float(y)) for loan_id, p, r, y in columns]
+        path = os.path.join(out_dir, "schedules" + SINKS[fmt][1])
+        with stage("schedules_" + fmt) as s:
+            with open_schedule_sink(path, fmt) as sink:
+                for loan_id, schedules in _ordered_map(build_loan_schedules, tasks, workers):
+                    for name, df_sched in schedules.items():
+                        sink.write(loan_id, name, df_sched)
+            s["loans"], s["workers"], s["rows"] = len(tasks), workers, sink.rows_written
+        results = [path]
+
+    if portfolio_plot:
+        with stage("portfolio_plot") as s:
+            jobs = []
+            for name in FREQUENCIES:
+                # Full amortization like the per-loan figures (a term_years column is ignored)
+                ending = batch_balances(loans, frequency_name=name)
+                path = os.path.join(out_dir, "portfolio_{}.png".format(name.replace(" ", "_")))
+                jobs.append((plot_portfolio_bands, path, (ending,), {"title": "Portfolio Balance Decline ({})".format(name)}))
+            results.extend(render_figures(jobs, workers))
+            s["figures"] = len(jobs)
+    elapsed = time.perf_counter() - start
+
+    # Throughput report
+    rate = len(tasks) / elapsed if elapsed > 0 else float("inf")
+    print("Processed {} loans in {:.2f} s with {} worker(s): {:.1f} loans/sec".format(len(tasks), elapsed, workers, rate))
+    return results
+
 if __name__ == "__main__":
-    # Asking the user to enter mortgage details
-    principal = float(input("Enter the mortgage principal amount: "))
-    rate = float(input("Enter the quoted interest rate (percent): "))
-    years = int(input("Enter the amortization period (years): "))
-    term_years = int(input("Enter the mortgage term (years): "))
+    # Batch mode: python LoanSchedule.py --batch loans.csv [--workers N] [--out-dir DIR]
+    parser = argparse.ArgumentParser(description="Loan amortization schedules (Assignment #2, Part A)")
+    parser.add_argument("--batch", metavar="CSV", help="CSV file of loans (principal, quoted_rate, amortization_years[, loan_id])")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes for --batch (default: all cores)")
+    parser.add_argument("--out-dir", default="schedules", help="output folder for --batch (default: schedules)")
+    parser.add_argument("--format", default="xlsx", choices=["xlsx"] + list(SINKS),
+                        help="--batch output: per-loan xlsx + png, or one long csv/parquet/arrow/feather table")
+    # Single loan without prompts: --principal 500000 --rate 5.5 --amortization 25 --term 5
+    # (or --config loan.json with keys principal, quoted_rate, amortization_years, term_years)
+    parser.add_argument("--principal", type=float, help="mortgage principal amount")
+    parser.add_argument("--rate", type=float, help="quoted interest rate (percent)")
+    parser.add_argument("--amortization", type=int, help="amortization period (years)")
+    parser.add_argument("--term", type=int, help="mortgage term (years)")
+    parser.add_argument("--config", metavar="JSON", help="JSON file with the mortgage details")
+    parser.add_argument("--excel", default="A2_PartA_Schedules.xlsx", help="Excel output file")
+    parser.add_argument("--plot", default="A2_PartA_BalanceDecline.png",
+                        help="figure output file (.png, .svg/.pdf vector, .csv/.json data only)")
+    parser.add_argument("--no-excel", action="store_true", help="skip the Excel output (xlsxwriter is not imported)")
+    parser.add_argument("--no-plot", action="store_true", help="skip the figure (matplotlib is not imported)")
+    parser.add_argument("--plot-points", type=int, default=None,
+                        help="downsample each plotted line to at most this many points (LTTB)")
+    parser.add_argument("--plot-format", default="png", choices=["png", "svg", "pdf", "csv", "json"],
+                        help="--batch figure format (svg/pdf vector, csv/json data only)")
+    parser.add_argument("--portfolio-plot", action="store_true",
+                        help="--batch: add percentile-band figures across all loans, one per frequency")
+    Instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    Instrumentation.configure_from_args(args)
+
+    if args.batch:
+        run_batch(args.batch, args.out_dir, args.workers, excel=not args.no_excel, plot=not args.no_plot, fmt=args.format,
+                  plot_points=args.plot_points, plot_format=args.plot_format, portfolio_plot=args.portfolio_plot)
+        raise SystemExit(0)
+
+    # Mortgage details come from the flags, then the --config file, and only then from prompts
+    config = {}
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+
+    def get_value(flag_value, key, prompt, cast):
+        if flag_value is not None:
+            return cast(flag_value)
+        if key in config:
+            return cast(config[key])
+        # Asking the user to enter the missing mortgage detail
+        return cast(input(prompt))
+
+    principal = get_value(args.principal, "principal", "Enter the mortgage principal amount: ", float)
+    rate = get_value(args.rate, "quoted_rate", "Enter the quoted interest rate (percent): ", float)
+    years = get_value(args.amortization, "amortization_years", "Enter the amortization period (years): ", int)
+    term_years = get_value(args.term, "term_years", "Enter the mortgage term (years): ", int)
 
     # Creating an object from the MortgagePayment class using the user input
     mortgage = MortgagePayment(rate, years)
 
     # Calling the payments method to calculate the 6 payment options
-    result = mortgage.payments(principal)
+    with stage("payments"):
+        result = mortgage.payments(principal)
 
     # Displaying results with 2 decimal places
     # Each print line corresponds to one payment type
@@ -178,38 +900,23 @@ if __name__ == "__main__":
     print("Rapid Bi-weekly Payment: ${:.2f}".format(result[4]))
     print("Rapid Weekly Payment: ${:.2f}".format(result[5]))
 
+    # Balance remaining at the end of the term for each payment option
+    print("\nBalance at the end of the {}-year term:".format(term_years))
+    for name, (periods_per_year, _) in FREQUENCIES.items():
+        print("  {}: ${:.2f}".format(name, mortgage.balance_at(principal, name, term_years * periods_per_year)))
+
     # Building six schedules and save to one Excel with multiple worksheets
     # Sheet names match the frequency labels used in the printout
-    frequencies = [
-        "Monthly",
-        "Semi-monthly",
-        "Bi-weekly",
-        "Weekly",
-        "Rapid Bi-weekly",
-        "Rapid Weekly"
-    ]
-
     # Creating schedules and collect balance series for plotting
-    schedules = {}
-    balances = {}
-
-    with pd.ExcelWriter("A2_PartA_Schedules.xlsx", engine="xlsxwriter") as writer:
-        for name in frequencies:
-            df_sched = mortgage.build_payment_schedule(principal, name)
-            schedules[name] = df_sched
-            balances[name] = df_sched["ending_balance"].values
-            # Replace spaces with underscore for sheet name; ensure <=31 chars
-            sheet_name = name.replace(" ", "_")[:31]
-            df_sched.to_excel(writer, sheet_name=sheet_name, index=False)
+    with stage("schedules") as s:
+        schedules = {name: mortgage.build_payment_schedule(principal, name) for name in FREQUENCIES}
+        balances = {name: df_sched["ending_balance"].values for name, df_sched in schedules.items()}
+        s["rows"] = sum(len(df_sched) for df_sched in schedules.values())
+    if not args.no_excel:
+        with stage("excel"):
+            write_schedules_excel(schedules, args.excel)
 
     # Ploting the balance decline for all six options on one figure
-    plt.figure()
-    for name in frequencies:
-        plt.plot(balances[name], label=name)
-    plt.title("Loan Balance Decline by Payment Frequency")
-    plt.xlabel("Period")
-    plt.ylabel("Ending Balance ($)")
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig("A2_PartA_BalanceDecline.png", dpi=200)
-    plt.close()
\ No newline at end of file
+    if not args.no_plot:
+        with stage("plot"):
+            plot_balance_decline(balances, args.plot, args.plot_points)